@@ -0,0 +1,139 @@
+from flask import Blueprint, current_app, render_template, redirect, url_for, request, session, flash, abort, Response, stream_with_context
+from models import db, Stock, Transaction, Order, Holding
+import ledger
+from ledger import OrderError
+from performance import performance_cache
+from db_routing import read_only
+from auth import current_user, login_required
+from listings import apply_filters, keyset_page, stream_csv
+
+# A logged-in user's portfolio, cash, orders and transaction history.
+
+account = Blueprint('account', __name__)
+
+@account.route('/portfolio')
+@login_required
+def portfolio():
+    from forms import AddCashForm, WithdrawCashForm
+    user = current_user()
+    add_cash_form = AddCashForm()
+    withdraw_cash_form = WithdrawCashForm()
+    
+    holdings = Holding.query.filter(Holding.user_id == user.id, Holding.quantity > 0).all()
+    performance = performance_cache.get(user.id)
+    pnl = performance['positions']
+    stocks_owned = [{'company_name': holding.stock.company_name, 'ticker': holding.stock.ticker, 'current_price': holding.stock.current_price, 'total_amount': holding.quantity, 'cost_basis': holding.cost_basis, 'unrealized': pnl.get(holding.stock_id, {}).get('unrealized'), 'realized': pnl.get(holding.stock_id, {}).get('realized')} for holding in holdings]
+    
+    return render_template('portfolio.html', user=user, add_cash_form=add_cash_form, withdraw_cash_form=withdraw_cash_form, stocks_owned=stocks_owned, performance=performance)
+
+@account.route('/transactions')
+@login_required
+@read_only
+def transactions():
+    query = Transaction.query.filter_by(user_id=session['user_id']).options(db.joinedload(Transaction.stock))
+    try:
+        query = apply_filters(query, Transaction, request.args, Transaction.transaction_type)
+        transactions, next_cursor = keyset_page(query, Transaction, request.args.get('before'), current_app.config['LISTING_PER_PAGE'])
+    except ValueError:
+        abort(400)
+    return render_template('transactions.html', transactions=transactions, next_cursor=next_cursor)
+
+@account.route('/transactions/export.csv')
+@login_required
+def export_transactions():
+    query = db.session.query(
+        Transaction.timestamp, Transaction.transaction_type, Stock.ticker, Transaction.amount, Transaction.price
+    ).join(Stock, Transaction.stock_id == Stock.id).filter(Transaction.user_id == session['user_id'])
+    try:
+        query = apply_filters(query, Transaction, request.args, Transaction.transaction_type)
+    except ValueError:
+        abort(400)
+    query = query.order_by(Transaction.timestamp, Transaction.id)
+    response = Response(stream_with_context(stream_csv(query, ['timestamp', 'type', 'ticker', 'amount', 'price'])), mimetype='text/csv')
+    response.headers['Content-Disposition'] = 'attachment; filename=transactions.csv'
+    return response
+
+@account.route('/orders')
+@login_required
+def orders():
+    query = Order.query.filter_by(user_id=session['user_id']).options(db.joinedload(Order.stock))
+    try:
+        query = apply_filters(query, Order, request.args, Order.order_type, Order.status)
+        orders, next_cursor = keyset_page(query, Order, request.args.get('before'), current_app.config['LISTING_PER_PAGE'])
+    except ValueError:
+        abort(400)
+    return render_template('orders.html', orders=orders, next_cursor=next_cursor)
+
+@account.route('/orders/export.csv')
+@login_required
+def export_orders():
+    query = db.session.query(
+        Order.timestamp, Order.order_type, Stock.ticker, Order.amount, Order.price, Order.status
+    ).join(Stock, Order.stock_id == Stock.id).filter(Order.user_id == session['user_id'])
+    try:
+        query = apply_filters(query, Order, request.args, Order.order_type, Order.status)
+    except ValueError:
+        abort(400)
+    query = query.order_by(Order.timestamp, Order.id)
+    response = Response(stream_with_context(stream_csv(query, ['timestamp', 'type', 'ticker', 'amount', 'price', 'status'])), mimetype='text/csv')
+    response.headers['Content-Disposition'] = 'attachment; filename=orders.csv'
+    return response
+
+@account.route('/cancel_order/<int:order_id>', methods=['POST'])
+@login_required
+def cancel_order(order_id):
+    order = Order.query.get_or_404(order_id)
+    if order.user_id != session['user_id']:
+        flash('You do not have permission to cancel this order.', 'danger')
+        return redirect(url_for('account.orders'))
+    if ledger.cancel_order(order):
+        flash('Order cancelled successfully.', 'success')
+    else:
+        flash('Order cannot be cancelled.', 'danger')
+    return redirect(url_for('account.orders'))
+
+def idempotency_key():
+    # Resubmitted forms and client retries carry the same key and map to one order
+    return request.form.get('idempotency_key') or request.headers.get('Idempotency-Key') or None
+
+def place_order(order_type):
+    user = current_user()
+    stock = Stock.query.get_or_404(request.form['stock_id'])
+    amount = int(request.form['amount'])
+    # An optional limit price makes this a limit order for the matching engine
+    limit_price = request.form.get('limit_price', type=float)
+    try:
+        ledger.place_order(user.id, stock, order_type, amount, limit_price=limit_price, idempotency_key=idempotency_key())
+        flash('Order placed successfully.', 'success')
+    except OrderError as e:
+        flash(str(e), 'danger')
+    return redirect(url_for('account.portfolio'))
+
+@account.route('/buy_stock', methods=['POST'])
+@login_required
+def buy_stock():
+    return place_order('buy')
+
+@account.route('/sell_stock', methods=['POST'])
+@login_required
+def sell_stock():
+    return place_order('sell')
+
+@account.route('/add_cash', methods=['POST'])
+@login_required
+def add_cash():
+    from forms import AddCashForm
+    form = AddCashForm()
+    if form.validate_on_submit():
+        ledger.deposit(session['user_id'], form.amount.data)
+    return redirect(url_for('account.portfolio'))
+
+@account.route('/withdraw_cash', methods=['POST'])
+@login_required
+def withdraw_cash():
+    from forms import WithdrawCashForm
+    form = WithdrawCashForm()
+    if form.validate_on_submit():
+        if not ledger.withdraw(session['user_id'], form.amount.data):
+            flash('You do not have enough money to withdraw this amount.', 'danger')
+    return redirect(url_for('account.portfolio'))
@@ -0,0 +1,177 @@
+import codecs
+from datetime import date, datetime
+from flask import Blueprint, current_app, render_template, redirect, url_for, request, flash
+from models import db, Stock, StockHistory, MarketHours, MarketSchedule
+from settlement import settle_pending_orders
+from quote_cache import quote_cache
+from market_calendar import market_calendar
+from price_stream import price_bus
+from db_routing import read_only
+from auth import admin_required
+from candles import record_ticks
+from stock_import import COLUMNS, import_stocks
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Admin-only pages: listings, prices, bulk imports, market hours, settlement and exports.
+
+admin = Blueprint('admin', __name__)
+
+@admin.route('/admin')
+@admin_required
+def dashboard():
+    return render_template('admin.html')
+
+@admin.route('/create_stock', methods=['GET', 'POST'])
+@admin_required
+def create_stock():
+    from forms import StockForm
+    form = StockForm()
+    if form.validate_on_submit():
+        company_name = form.company_name.data
+        ticker = form.ticker.data
+        volume = form.volume.data
+        initial_price = form.initial_price.data
+        stock = Stock(company_name=company_name, ticker=ticker, volume=volume, initial_price=initial_price, current_price=initial_price)
+        db.session.add(stock)
+        db.session.commit()
+        quote_cache.invalidate()
+        return redirect(url_for('admin.dashboard'))
+    return render_template('create_stock.html', form=form)
+
+@admin.route('/market_hours', methods=['GET', 'POST'])
+@admin_required
+def market_hours():
+    from forms import MarketHoursForm
+    form = MarketHoursForm()
+    if form.validate_on_submit():
+        day_of_week = form.day_of_week.data
+        open_time = form.open_time.data
+        close_time = form.close_time.data
+        market_hours = MarketHours.query.filter_by(day_of_week=day_of_week).first()
+        if market_hours:
+            market_hours.open_time = open_time
+            market_hours.close_time = close_time
+        else:
+            market_hours = MarketHours(day_of_week=day_of_week, open_time=open_time, close_time=close_time)
+            db.session.add(market_hours)
+        db.session.commit()
+        market_calendar.invalidate()
+        return redirect(url_for('admin.market_hours'))
+    market_hours = MarketHours.query.all()
+    return render_template('market_hours.html', form=form, market_hours=market_hours)
+
+@admin.route('/market_schedule', methods=['GET', 'POST'])
+@admin_required
+def market_schedule():
+    from forms import MarketScheduleForm
+    form = MarketScheduleForm()
+    if form.validate_on_submit():
+        date = form.date.data
+        description = form.description.data
+        is_closed = form.is_closed.data
+        market_schedule = MarketSchedule.query.filter_by(date=date).first()
+        if market_schedule:
+            market_schedule.description = description
+            market_schedule.is_closed = is_closed
+        else:
+            market_schedule = MarketSchedule(date=date, description=description, is_closed=is_closed)
+            db.session.add(market_schedule)
+        db.session.commit()
+        market_calendar.invalidate()
+        return redirect(url_for('admin.market_schedule'))
+    market_schedule = MarketSchedule.query.all()
+    return render_template('market_schedule.html', form=form, market_schedule=market_schedule)
+
+@admin.route('/update_stock_price', methods=['GET', 'POST'])
+@admin_required
+def update_stock_price():
+    if request.method == 'POST':
+        stock_id = request.form['stock_id']
+        new_price = float(request.form['new_price'])
+        stock = Stock.query.get(stock_id)
+        if stock:
+            stock.current_price = new_price
+            db.session.commit()
+            quote_cache.invalidate()
+            price_bus.publish([{'ticker': stock.ticker, 'price': new_price, 'high': stock.high_price, 'low': stock.low_price}])
+            flash('Stock price updated successfully.', 'success')
+        else:
+            flash('Stock not found.', 'danger')
+        return redirect(url_for('admin.update_stock_price'))
+    stocks = quote_cache.all()
+    return render_template('update_stock_price.html', stocks=stocks)
+
+@admin.route('/edit_stock_price/<int:stock_id>', methods=['POST'])
+@admin_required
+def edit_stock_price(stock_id):
+    stock = Stock.query.get_or_404(stock_id)
+    new_price = float(request.form['new_price'])
+    stock.current_price = new_price
+    # Log the price change in StockHistory
+    timestamp = datetime.now()
+    stock_history = StockHistory(stock_id=stock.id, price=new_price, timestamp=timestamp)
+    db.session.add(stock_history)
+    record_ticks([(stock.id, new_price)], timestamp)
+    db.session.commit()
+    quote_cache.invalidate()
+    price_bus.publish([{'ticker': stock.ticker, 'price': new_price, 'high': stock.high_price, 'low': stock.low_price}])
+    flash('Stock price updated successfully.', 'success')
+    return redirect(url_for('market.view_stock', stock_id=stock.id))
+
+@admin.route('/process_pending_orders', methods=['POST'])
+@admin_required
+def process_pending_orders():
+    stats = settle_pending_orders()
+    if stats['failed_chunks']:
+        logger.error("Manual processing of pending orders failed.")
+        flash('Processing pending orders failed.', 'danger')
+        return redirect(url_for('admin.dashboard'))
+    logger.info("Manual processing of pending orders successful.")
+    flash(f"Processed {stats['orders']} pending orders.", 'success')
+    return redirect(url_for('admin.dashboard'))
+
+@admin.route('/admin/export', methods=['POST'])
+@admin_required
+@read_only
+def export_history():
+    # Runs inside the request, so only bounded ranges; full exports belong to export_history.py
+    max_days = current_app.config['EXPORT_WEB_MAX_DAYS']
+    try:
+        start = date.fromisoformat(request.form['start'])
+        end = date.fromisoformat(request.form['end'])
+    except (KeyError, ValueError):
+        flash('Choose a start and end date (YYYY-MM-DD).', 'danger')
+        return redirect(url_for('admin.dashboard'))
+    if end < start:
+        flash('The end date must not be before the start date.', 'danger')
+        return redirect(url_for('admin.dashboard'))
+    if (end - start).days + 1 > max_days:
+        flash(f"Exports here cover at most {max_days} days; run python export_history.py for longer ranges.", 'danger')
+        return redirect(url_for('admin.dashboard'))
+    from columnar import export_all  # numpy; loaded on first export
+    results = export_all(current_app.config['EXPORT_DIR'], start, end, current_app.config['EXPORT_FORMAT'])
+    summary = ', '.join(f"{table}: {rows} rows in {partitions} partitions" for table, (rows, partitions) in results.items())
+    flash(f"Exported to {current_app.config['EXPORT_DIR']} ({summary}).", 'success')
+    return redirect(url_for('admin.dashboard'))
+
+@admin.route('/admin/import', methods=['GET', 'POST'])
+@admin_required
+def import_stocks_csv():
+    if request.method == 'GET':
+        return render_template('import_stocks.html', columns=COLUMNS, report=None)
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        flash('Choose a CSV file to import.', 'danger')
+        return redirect(url_for('admin.import_stocks_csv'))
+    try:
+        # Decode line by line so the upload is never read into memory whole
+        report = import_stocks(codecs.iterdecode(upload.stream, 'utf-8-sig'), current_app.config['IMPORT_CHUNK_SIZE'])
+    except UnicodeDecodeError:
+        db.session.rollback()
+        flash('The file is not UTF-8 text; only the chunks before the bad line were imported.', 'danger')
+        return redirect(url_for('admin.import_stocks_csv'))
+    flash(f"Imported {report['imported']} of {report['rows']} rows: {report['created']} listings created, "
+          f"{report['updated']} updated, {report['ticks']} prices recorded.", 'success' if not report['errors'] else 'warning')
+    return render_template('import_stocks.html', columns=COLUMNS, report=report)
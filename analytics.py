@@ -0,0 +1,100 @@
+import os
+import sys
+import numpy as np
+from columnar import COLUMNS, partition_name
+
+# Per-ticker statistics over a columnar export written by columnar.py. Only
+# the exported files are read, never the database: .npy columns are
+# memory-mapped, and every ticker's rows are laid end to end in flat arrays so
+# returns, volatility and VWAP are computed for all tickers at once with
+# segment reductions instead of a Python loop per ticker.
+
+def _read_partition(path):
+    if os.path.exists(os.path.join(path, 'part.parquet')):
+        import pyarrow.parquet as pq
+        table = pq.read_table(os.path.join(path, 'part.parquet'), memory_map=True)
+        return {name: table.column(name).to_numpy() for name in table.column_names}
+    return {name[:-4]: np.load(os.path.join(path, name), mmap_mode='r') for name in os.listdir(path) if name.endswith('.npy')}
+
+def load(root, table, tickers=None, start=None, end=None):
+    # Returns (tickers, offsets, columns): ticker i owns rows offsets[i]:offsets[i + 1]
+    base = os.path.join(root, table)
+    wanted = {partition_name(ticker) for ticker in tickers} if tickers else None
+    names, offsets, parts = [], [0], {name: [] for name in COLUMNS[table]}
+    for ticker_dir in sorted(os.listdir(base)) if os.path.isdir(base) else []:
+        if wanted is not None and ticker_dir not in wanted:
+            continue
+        count = 0
+        for date_dir in sorted(os.listdir(os.path.join(base, ticker_dir))):
+            day = date_dir[len('date='):]
+            if date_dir.endswith('.tmp') or (start and day < start.isoformat()) or (end and day > end.isoformat()):
+                continue
+            columns = _read_partition(os.path.join(base, ticker_dir, date_dir))
+            for name in parts:
+                parts[name].append(columns[name])
+            count += len(columns['timestamp'])
+        if count:
+            names.append(ticker_dir[len('ticker='):])
+            offsets.append(offsets[-1] + count)
+    columns = {
+        name: (arrays[0] if len(arrays) == 1 else np.concatenate(arrays)) if arrays else np.empty(0, dtype=COLUMNS[table][name])
+        for name, arrays in parts.items()
+    }
+    return names, np.array(offsets), columns
+
+def price_stats(root, tickers=None, start=None, end=None):
+    names, offsets, columns = load(root, 'stock_price_history', tickers, start, end)
+    if not names:
+        return {}
+    starts, counts = offsets[:-1], np.diff(offsets)
+    price = np.asarray(columns['price'], dtype='float64')
+    log_returns = np.diff(np.log(price), prepend=np.nan)
+    log_returns[starts] = np.nan  # The first tick of each ticker has no predecessor
+    valid = ~np.isnan(log_returns)
+    filled = np.where(valid, log_returns, 0.0)
+    n = np.add.reduceat(valid.astype('int64'), starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.add.reduceat(filled, starts) / n
+        deviations = np.where(valid, filled - np.repeat(mean, counts), 0.0)
+        volatility = np.sqrt(np.add.reduceat(deviations * deviations, starts) / (n - 1))
+    first, last = price[starts], price[offsets[1:] - 1]
+    return {
+        name: {
+            'ticks': int(counts[i]), 'first': float(first[i]), 'last': float(last[i]),
+            'return': float(last[i] / first[i] - 1), 'volatility': float(volatility[i]) if n[i] > 1 else None,
+        }
+        for i, name in enumerate(names)
+    }
+
+def vwap(root, tickers=None, start=None, end=None):
+    names, offsets, columns = load(root, 'transaction', tickers, start, end)
+    if not names:
+        return {}
+    starts = offsets[:-1]
+    price = np.asarray(columns['price'], dtype='float64')
+    amount = np.asarray(columns['amount'], dtype='float64')
+    volume = np.add.reduceat(amount, starts)
+    notional = np.add.reduceat(price * amount, starts)
+    return {
+        name: {'trades': int(offsets[i + 1] - offsets[i]), 'volume': int(volume[i]), 'vwap': float(notional[i] / volume[i]) if volume[i] else None}
+        for i, name in enumerate(names)
+    }
+
+def summary(root, tickers=None, start=None, end=None):
+    stats = price_stats(root, tickers, start, end)
+    for name, values in vwap(root, tickers, start, end).items():
+        stats.setdefault(name, {}).update(values)
+    return stats
+
+if __name__ == '__main__':
+    # Usage: python analytics.py EXPORT_DIR [ticker ...]
+    stats = summary(sys.argv[1], sys.argv[2:] or None)
+    print(f"{'ticker':<12}{'ticks':>8}{'return':>10}{'volatility':>12}{'trades':>8}{'vwap':>12}")
+    for name, values in stats.items():
+        volatility = values.get('volatility')
+        vwap_value = values.get('vwap')
+        print(
+            f"{name:<12}{values.get('ticks', 0):>8}{values.get('return', 0.0):>10.2%}"
+            f"{volatility if volatility is not None else float('nan'):>12.5f}{values.get('trades', 0):>8}"
+            f"{vwap_value if vwap_value is not None else float('nan'):>12.2f}"
+        )
@@ -0,0 +1,207 @@
+import hashlib
+import math
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import Blueprint, current_app, jsonify, request, session
+from models import db, User, Stock, Holding, Order
+from quote_cache import quote_cache
+from performance import performance_cache
+from db_routing import read_only
+from candles import RESOLUTIONS, candle_retention, pick_resolution, history_query
+import ledger
+from ledger import OrderError
+from compression import matching_etag
+
+# Versioned JSON API for programmatic clients, registered under /api/v1. It
+# uses the same session login as the HTML pages. Quote responses carry an
+# ETag built from quote_cache.version(), so a poll between ticks is answered
+# with 304 before any quote is serialized or history row read. Portfolio and
+# order responses are tagged with a digest of their body instead, since they
+# also change on settlement.
+
+api = Blueprint('api', __name__)
+
+def error(status, message):
+    response = jsonify({'error': message})
+    response.status_code = status
+    return response
+
+def api_login_required(view):
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if 'user_id' not in session:
+            return error(401, 'Login required.')
+        return view(*args, **kwargs)
+    return wrapped
+
+def not_modified(etag):
+    # Also matches the compressed variants compression.py tags as <etag>-gzip / <etag>-br
+    tag = matching_etag(etag)
+    if tag is not None:
+        response = current_app.response_class(status=304)
+        response.set_etag(tag)
+        response.vary.add('Accept-Encoding')
+        return response
+    return None
+
+def conditional(response):
+    response.add_etag()
+    return response.make_conditional(request)
+
+def quote_json(quote):
+    return {
+        'ticker': quote['ticker'], 'company_name': quote['company_name'], 'price': quote['current_price'],
+        'high': quote['high_price'], 'low': quote['low_price'], 'volume': quote['volume'],
+    }
+
+def order_json(order):
+    quote = quote_cache.get(order.stock_id)
+    return {
+        'id': order.id, 'ticker': quote['ticker'] if quote else None, 'side': order.order_type, 'kind': order.order_kind,
+        'amount': order.amount, 'filled_amount': order.filled_amount, 'price': order.price, 'status': order.status,
+        'timestamp': order.timestamp.isoformat() if order.timestamp else None, 'idempotency_key': order.idempotency_key,
+    }
+
+@api.route('/quotes')
+def quotes():
+    # ?tickers=AAA,BBB for a batch; all listings without it. Each batch gets its own ETag.
+    tickers = [ticker for ticker in request.args.get('tickers', '').split(',') if ticker]
+    etag = f'q-{quote_cache.version()}'
+    if tickers:
+        etag += f"-{hashlib.blake2b(','.join(tickers).encode(), digest_size=8).hexdigest()}"
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    if tickers:
+        found = {ticker: quote_cache.get_by_ticker(ticker) for ticker in tickers}
+        body = {
+            'quotes': [quote_json(quote) for quote in found.values() if quote],
+            'missing': [ticker for ticker, quote in found.items() if quote is None],
+        }
+    else:
+        body = {'quotes': [quote_json(quote) for quote in quote_cache.all()], 'missing': []}
+    response = jsonify(body)
+    response.set_etag(etag)
+    return response
+
+@api.route('/portfolio')
+@api_login_required
+def portfolio():
+    user_id = session['user_id']
+    cash = db.session.query(User.cash_account).filter_by(id=user_id).scalar()
+    holdings = db.session.query(Holding.stock_id, Holding.quantity, Holding.reserved, Holding.cost_basis) \
+        .filter(Holding.user_id == user_id, Holding.quantity > 0).order_by(Holding.stock_id).all()
+    positions = []
+    market_value = 0.0
+    for holding in holdings:
+        quote = quote_cache.get(holding.stock_id)
+        price = quote['current_price'] if quote else None
+        value = price * holding.quantity if price is not None else None
+        market_value += value or 0.0
+        positions.append({
+            'ticker': quote['ticker'] if quote else None, 'quantity': holding.quantity, 'reserved': holding.reserved,
+            'cost_basis': holding.cost_basis, 'price': price, 'market_value': value,
+            'unrealized_pnl': value - holding.cost_basis if value is not None else None,
+        })
+    return conditional(jsonify({
+        'cash': str(cash), 'market_value': round(market_value, 2),
+        'total_value': str(ledger.money(cash) + ledger.money(market_value)), 'positions': positions,
+    }))
+
+@api.route('/portfolio/performance')
+@api_login_required
+def performance():
+    # FIFO P&L per position and the daily value curve; ?days=N trims the curve
+    result = performance_cache.get(session['user_id'])
+    days = request.args.get('days', type=int)
+    curve = result['curve'][-days:] if days else result['curve']
+    positions = [dict(position, stock_id=stock_id) for stock_id, position in result['positions'].items()]
+    return conditional(jsonify({
+        'realized': result['realized'], 'unrealized': result['unrealized'],
+        'time_weighted_return': result['time_weighted_return'], 'positions': positions, 'curve': curve,
+    }))
+
+@api.route('/orders', methods=['POST'])
+@api_login_required
+def place_order():
+    data = request.get_json(silent=True) or {}
+    quote = quote_cache.get_by_ticker(data.get('ticker', ''))
+    if quote is None:
+        return error(404, 'Unknown ticker.')
+    if data.get('side') not in ('buy', 'sell'):
+        return error(400, "side must be 'buy' or 'sell'.")
+    # JSON types are checked as sent: int() would truncate 2.7 to 2 and turn true into 1
+    amount, limit_price = data.get('amount'), data.get('limit_price')
+    if not isinstance(amount, int) or isinstance(amount, bool) or amount <= 0:
+        return error(400, 'amount must be a positive integer.')
+    if limit_price is not None:
+        if not isinstance(limit_price, (int, float)) or isinstance(limit_price, bool) or not (math.isfinite(limit_price) and limit_price > 0):
+            return error(400, 'limit_price must be a positive number.')
+        limit_price = float(limit_price)
+    stock = Stock.query.get(quote['id'])
+    key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    try:
+        order = ledger.place_order(session['user_id'], stock, data['side'], amount, limit_price=limit_price, idempotency_key=key)
+    except OrderError as e:
+        return error(422, str(e))
+    return jsonify(order_json(order)), 201
+
+@api.route('/orders/<int:order_id>')
+@api_login_required
+def get_order(order_id):
+    order = Order.query.filter_by(id=order_id, user_id=session['user_id']).first()
+    if order is None:
+        return error(404, 'Order not found.')
+    return conditional(jsonify(order_json(order)))
+
+@api.route('/orders/<int:order_id>', methods=['DELETE'])
+@api_login_required
+def cancel_order(order_id):
+    order = Order.query.filter_by(id=order_id, user_id=session['user_id']).first()
+    if order is None:
+        return error(404, 'Order not found.')
+    if not ledger.cancel_order(order):
+        return error(409, 'Order cannot be cancelled.')
+    return jsonify(order_json(order))
+
+@api.route('/history/<ticker>')
+@read_only
+def history(ticker):
+    # History only grows on a tick, so the quote version plus the query identifies the response
+    etag = f"h-{quote_cache.version()}-{hashlib.blake2b(request.full_path.encode(), digest_size=8).hexdigest()}"
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    quote = quote_cache.get_by_ticker(ticker)
+    if quote is None:
+        return error(404, 'Unknown ticker.')
+    try:
+        end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else datetime.now()
+        start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else end - timedelta(days=1)
+    except ValueError:
+        return error(400, 'start and end must be ISO 8601 timestamps.')
+    if start >= end:
+        return error(400, 'start must be before end.')
+    resolution = request.args.get('resolution', 'auto')
+    if resolution == 'auto':
+        resolution = pick_resolution(start, end, current_app.config['HISTORY_MAX_POINTS'], candle_retention(current_app.config))
+    elif resolution != 'raw' and resolution not in RESOLUTIONS:
+        return error(400, f"resolution must be auto, raw or one of {', '.join(RESOLUTIONS)}.")
+    limit = current_app.config['API_HISTORY_LIMIT']
+    rows = history_query(quote['id'], start, end, resolution).limit(limit + 1).all()
+    truncated = len(rows) > limit
+    rows = rows[:limit][::-1]  # history_query is newest first; return oldest first
+    if resolution == 'raw':
+        points = [{'timestamp': row.timestamp.isoformat(), 'price': row.price} for row in rows]
+    else:
+        points = [
+            {'timestamp': row.bucket_start.isoformat(), 'open': row.open, 'high': row.high, 'low': row.low,
+             'close': row.close, 'ticks': row.tick_count}
+            for row in rows
+        ]
+    response = jsonify({
+        'ticker': ticker, 'resolution': resolution, 'start': start.isoformat(), 'end': end.isoformat(),
+        'truncated': truncated, 'points': points,
+    })
+    response.set_etag(etag)
+    return response
@@ -0,0 +1,55 @@
+from functools import wraps
+from flask import g, session, redirect, url_for, current_app
+from models import User
+
+# The logged-in user is loaded at most once per request and kept on g. The
+# is_admin flag is also stored in the signed session at login, so templates
+# can show the admin nav without loading the user (a role change shows there
+# on the user's next login). admin_required never trusts that flag: it checks
+# the user row, so a demoted admin loses access immediately.
+
+def current_user():
+    if 'current_user' not in g:
+        g.current_user = User.query.get(session['user_id']) if 'user_id' in session else None
+    return g.current_user
+
+def is_admin():
+    # For rendering only; authorization goes through admin_required
+    if 'user_id' not in session:
+        return False
+    if current_app.config['SESSION_USER_FLAGS'] and 'is_admin' in session:
+        return session['is_admin']
+    user = current_user()
+    return bool(user and user.is_admin)
+
+def login_user(user):
+    session['user_id'] = user.id
+    if current_app.config['SESSION_USER_FLAGS']:
+        session['is_admin'] = bool(user.is_admin)
+    g.current_user = user
+
+def logout_user():
+    session.pop('user_id', None)
+    session.pop('is_admin', None)
+    g.pop('current_user', None)
+
+def login_required(view):
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if 'user_id' not in session:
+            return redirect(url_for('auth.login'))
+        return view(*args, **kwargs)
+    return wrapped
+
+def admin_required(view):
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if 'user_id' not in session:
+            return redirect(url_for('auth.login'))
+        user = current_user()
+        if not (user and user.is_admin):
+            if 'is_admin' in session:
+                session['is_admin'] = False
+            return redirect(url_for('market.index'))
+        return view(*args, **kwargs)
+    return wrapped
@@ -0,0 +1,55 @@
+from flask import Blueprint, render_template, redirect, url_for
+from werkzeug.security import generate_password_hash, check_password_hash
+from models import db, User
+from auth import current_user, login_user, logout_user, login_required
+
+# Registration, login and the user's own profile.
+
+auth = Blueprint('auth', __name__)
+
+@auth.route('/register', methods=['GET', 'POST'])
+def register():
+    from forms import RegistrationForm
+    form = RegistrationForm()
+    if form.validate_on_submit():
+        full_name = form.full_name.data
+        username = form.username.data
+        email = form.email.data
+        password = generate_password_hash(form.password.data)
+        user = User(full_name=full_name, username=username, email=email, password=password)
+        db.session.add(user)
+        db.session.commit()
+        return redirect(url_for('auth.login'))
+    return render_template('register.html', form=form)
+
+@auth.route('/login', methods=['GET', 'POST'])
+def login():
+    from forms import LoginForm
+    form = LoginForm()
+    if form.validate_on_submit():
+        username = form.username.data
+        password = form.password.data
+        user = User.query.filter_by(username=username).first()
+        if user and check_password_hash(user.password, password):
+            login_user(user)
+            return redirect(url_for('market.index'))
+    return render_template('login.html', form=form)
+
+@auth.route('/logout')
+def logout():
+    logout_user()
+    return redirect(url_for('market.index'))
+
+@auth.route('/profile', methods=['GET', 'POST'])
+@login_required
+def profile():
+    from forms import UpdateProfileForm
+    user = current_user()
+    form = UpdateProfileForm()
+    if form.validate_on_submit():
+        user.email = form.email.data
+        user.password = generate_password_hash(form.password.data)
+        db.session.commit()
+        return redirect(url_for('auth.profile'))
+    form.email.data = user.email
+    return render_template('profile.html', form=form)
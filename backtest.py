@@ -0,0 +1,69 @@
+import argparse
+import json
+import logging
+from datetime import datetime
+from config import Config
+from replay import read_orders, replay
+
+# Usage: python backtest.py [--orders FILE] [--tickers A,B] [--start ISO] [--end ISO]
+#        [--generate N --interval SECONDS] [--orders-per-tick N] [--processes N] [--speed X] [--json FILE]
+# Replays the configured database's price history (or generated ticks) into
+# throwaway sandbox databases; see replay.py.
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay price history and an order stream at accelerated virtual time.')
+    parser.add_argument('--source', default=Config.SQLALCHEMY_DATABASE_URI, help='database to read listings and history from')
+    parser.add_argument('--orders', help='CSV of scripted orders: at,user,ticker,side,amount[,limit_price]')
+    parser.add_argument('--tickers', type=lambda value: [ticker.strip().upper() for ticker in value.split(',')])
+    parser.add_argument('--start', type=datetime.fromisoformat, help='default: the first recorded tick')
+    parser.add_argument('--end', type=datetime.fromisoformat)
+    parser.add_argument('--generate', type=int, help='generate N ticks instead of replaying history')
+    parser.add_argument('--interval', type=int, default=60, help='virtual seconds between generated ticks')
+    parser.add_argument('--orders-per-tick', type=int, default=0, help='random orders to add after every tick, across all partitions')
+    parser.add_argument('--users', type=lambda value: value.split(','), help='traders to create (default: the script users)')
+    parser.add_argument('--cash', type=int, default=100000, help='starting cash per user, split evenly between partitions')
+    parser.add_argument('--shares', type=int, default=0, help='starting shares per user in every stock')
+    parser.add_argument('--processes', type=int, help='partitions by ticker (default: CPU count)')
+    parser.add_argument('--settle-interval', type=int, default=60, help='virtual seconds between settlement runs')
+    parser.add_argument('--match-interval', type=int, default=Config.MATCHING_INTERVAL, help='virtual seconds between matching runs')
+    parser.add_argument('--speed', type=float, default=0, help='virtual seconds per wall second (0: as fast as possible)')
+    parser.add_argument('--sandbox-url', help='database URL per partition, with {partition}; default: temporary SQLite files')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='write the full report, including every position, to this file')
+    parser.add_argument('--verbose', action='store_true', help='log settlement and matching runs')
+    args = parser.parse_args()
+
+    orders, errors = read_orders(args.orders) if args.orders else ([], [])
+    for line, message in errors:
+        print(f"orders line {line}: {message}")
+    try:
+        report = replay(
+            args.source, tickers=args.tickers, start=args.start, end=args.end, orders=orders, generate=args.generate,
+            interval=args.interval, orders_per_tick=args.orders_per_tick, users=args.users, cash=args.cash,
+            shares=args.shares, processes=args.processes, settle_interval=args.settle_interval,
+            match_interval=args.match_interval, speed=args.speed, sandbox_url=args.sandbox_url, seed=args.seed,
+            log_level=logging.INFO if args.verbose else logging.WARNING,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    print(f"Replayed {report['start']} to {report['end']} ({report['virtual_seconds'] / 3600:.1f} virtual hours) "
+          f"in {report['elapsed']:.1f}s across {report['processes']} processes: {report['speedup']:.0f}x real time.")
+    print(f"{report['ticks']} price ticks ({report['ticks_per_sec']:.0f}/s), {report['orders']} orders placed "
+          f"({report['orders_per_sec']:.0f}/s), {report['rejected']} rejected, {report['settled']} settled, "
+          f"{report['fills']} limit fills, {report['expired']} cancelled at the end, {report['transactions']} transactions.")
+    if report['unknown_orders']:
+        print(f"{report['unknown_orders']} scripted orders named tickers outside the replay and were skipped.")
+    for partition in report['partitions']:
+        print(f"  partition {partition['partition']}: {len(partition['tickers'])} tickers, {partition['ticks']} ticks, "
+              f"{partition['orders']} orders in {partition['elapsed']:.1f}s")
+    print(f"{'User':20} {'Cash':>14} {'Market value':>14} {'Total':>14} {'Positions':>10}")
+    for username, portfolio in sorted(report['portfolios'].items(), key=lambda item: -item[1]['total']):
+        print(f"{username:20} {portfolio['cash']:>14.2f} {portfolio['market_value']:>14.2f} "
+              f"{portfolio['total']:>14.2f} {len(portfolio['positions']):>10}")
+    if args.json:
+        with open(args.json, 'w') as stream:
+            json.dump(report, stream, indent=2, default=str)
+
+if __name__ == '__main__':
+    main()
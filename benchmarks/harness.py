@@ -0,0 +1,178 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Seeds a throwaway database, drives the routes through Flask's test client
+# from several threads and times the background jobs. Reports p50/p95/p99
+# latency, SQL statements per request and throughput for each, and compares
+# against a saved baseline.
+#
+# Usage: python -m benchmarks.harness [--users N --stocks N --transactions N
+#        --history N --requests N --concurrency N] [--database-url URL | --replica]
+#        [--save-baseline FILE | --baseline FILE]
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+class QueryCounter:
+    def __init__(self):
+        self._local = threading.local()
+
+    def __call__(self, *args):
+        self._local.count = getattr(self._local, 'count', 0) + 1
+
+    def reset(self):
+        self._local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+def route_plan(stocks):
+    # (name, method, path factory, form factory)
+    return [
+        ('index', 'GET', lambda rng: '/', None),
+        ('view_stock', 'GET', lambda rng: f'/view_stock/{rng.randrange(1, stocks + 1)}', None),
+        ('stock_history', 'GET', lambda rng: f'/stock_history/{rng.randrange(1, stocks + 1)}', None),
+        ('portfolio', 'GET', lambda rng: '/portfolio', None),
+        ('transactions', 'GET', lambda rng: '/transactions', None),
+        ('orders', 'GET', lambda rng: '/orders', None),
+        ('api_quotes', 'GET', lambda rng: '/api/v1/quotes?tickers=' + ','.join(f'T{rng.randrange(1, stocks + 1):05d}' for _ in range(10)), None),
+        ('api_portfolio', 'GET', lambda rng: '/api/v1/portfolio', None),
+        ('buy_stock', 'POST', lambda rng: '/buy_stock', lambda rng: {'stock_id': rng.randrange(1, stocks + 1), 'amount': 1}),
+        ('sell_stock', 'POST', lambda rng: '/sell_stock', lambda rng: {'stock_id': rng.randrange(1, stocks + 1), 'amount': 1}),
+    ]
+
+def summarize(latencies, queries, elapsed):
+    return {
+        'count': len(latencies),
+        'p50_ms': 1000 * percentile(latencies, 50),
+        'p95_ms': 1000 * percentile(latencies, 95),
+        'p99_ms': 1000 * percentile(latencies, 99),
+        'queries_per_request': statistics.mean(queries) if queries else 0.0,
+        'throughput': len(latencies) / elapsed if elapsed > 0 else 0.0,
+    }
+
+def bench_routes(app, counter, users, stocks, requests, concurrency):
+    from benchmarks.seed import PASSWORD
+    results = {}
+    for name, method, path, form in route_plan(stocks):
+        latencies, queries = [], []
+        lock = threading.Lock()
+
+        def worker(worker_id):
+            rng = random.Random(worker_id)
+            client = app.test_client()
+            client.post('/login', data={'username': f'user{worker_id % users + 1}', 'password': PASSWORD})
+            for _ in range(requests // concurrency):
+                url = path(rng)
+                data = form(rng) if form else None
+                counter.reset()
+                started = time.perf_counter()
+                response = client.open(url, method=method, data=data)
+                elapsed = time.perf_counter() - started
+                if response.status_code >= 400:
+                    raise RuntimeError(f"{method} {url} returned {response.status_code}")
+                with lock:
+                    latencies.append(elapsed)
+                    queries.append(counter.count)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, range(concurrency)))
+        results[name] = summarize(latencies, queries, time.perf_counter() - started)
+    return results
+
+def bench_jobs(app, counter, runs):
+    from jobs import process_pending_orders_job
+    from stock_price_generator import update_stock_prices
+    results = {}
+    for name, job in (('update_stock_prices', update_stock_prices), ('process_pending_orders_job', process_pending_orders_job)):
+        latencies, queries = [], []
+        started = time.perf_counter()
+        for _ in range(runs):
+            counter.reset()
+            job_started = time.perf_counter()
+            with app.app_context():
+                job()
+            latencies.append(time.perf_counter() - job_started)
+            queries.append(counter.count)
+        results[name] = summarize(latencies, queries, time.perf_counter() - started)
+    return results
+
+def print_report(results, baseline=None):
+    print(f"{'name':<28}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'per sec':>10}{'p95 vs base':>13}")
+    for name, row in results.items():
+        delta = ''
+        if baseline and name in baseline and baseline[name]['p95_ms']:
+            delta = f"{100 * (row['p95_ms'] / baseline[name]['p95_ms'] - 1):+.1f}%"
+        print(f"{name:<28}{row['count']:>7}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}"
+              f"{row['queries_per_request']:>9.1f}{row['throughput']:>10.1f}{delta:>13}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark StockApp routes and background jobs.')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--stocks', type=int, default=200)
+    parser.add_argument('--transactions', type=int, default=50000)
+    parser.add_argument('--history', type=int, default=100, help='history rows per stock')
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--job-runs', type=int, default=5)
+    parser.add_argument('--database-url', help='defaults to a temporary SQLite file')
+    parser.add_argument('--replica', action='store_true', help='route read-only views to a copied SQLite replica')
+    parser.add_argument('--baseline', help='compare against this baseline file')
+    parser.add_argument('--save-baseline', help='write the results to this baseline file')
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        directory = tempfile.mkdtemp()
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, 'benchmark.db')
+        if args.replica:
+            os.environ['REPLICA_DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, 'replica.db')
+    os.environ.setdefault('SCHEDULER_ENABLED', '0')
+
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from app import create_app
+    from benchmarks.seed import seed
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        started = time.perf_counter()
+        counts = seed(args.users, args.stocks, args.transactions, args.history)
+        print(f"Seeded {counts} in {time.perf_counter() - started:.1f}s")
+        if app.config['SQLALCHEMY_BINDS'].get('replica', '').startswith('sqlite'):
+            from db_routing import copy_sqlite_replica
+            copy_sqlite_replica(app)
+    # Listen on every engine so replica reads are counted too
+    counter = QueryCounter()
+    event.listen(Engine, 'before_cursor_execute', counter)
+
+    results = bench_routes(app, counter, args.users, args.stocks, args.requests, args.concurrency)
+    results.update(bench_jobs(app, counter, args.job_runs))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    print_report(results, baseline)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'params': vars(args), 'results': results}, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+import argparse
+import random
+import time
+from order_book import OrderBook
+
+# Throughput of the in-memory matching engine on a synthetic order stream.
+# Usage: python -m benchmarks.order_book [--orders N] [--cancel-rate R] [--seed S]
+
+def synthetic_stream(count, cancel_rate, seed):
+    rng = random.Random(seed)
+    live = []
+    for order_id in range(1, count + 1):
+        if live and rng.random() < cancel_rate:
+            yield ('cancel', live.pop(rng.randrange(len(live))))
+            continue
+        side = 'buy' if rng.random() < 0.5 else 'sell'
+        # Prices cluster around 100 so roughly half the orders cross the spread
+        price = round(100 + rng.gauss(0, 0.5) + (-0.05 if side == 'buy' else 0.05), 2)
+        live.append(order_id)
+        yield ('add', (order_id, rng.randrange(1, 1000), side, price, rng.randrange(1, 100)))
+
+def run(orders=200000, cancel_rate=0.05, seed=1):
+    stream = list(synthetic_stream(orders, cancel_rate, seed))
+    book = OrderBook()
+    fills = 0
+    started = time.perf_counter()
+    for action, payload in stream:
+        if action == 'add':
+            fills += len(book.add(*payload))
+        else:
+            book.cancel(payload)
+    elapsed = time.perf_counter() - started
+    return {
+        'events': len(stream),
+        'fills': fills,
+        'resting': len(book),
+        'elapsed': elapsed,
+        'events_per_sec': len(stream) / elapsed,
+        'matches_per_sec': fills / elapsed,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the limit order book matching engine.')
+    parser.add_argument('--orders', type=int, default=200000)
+    parser.add_argument('--cancel-rate', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    result = run(args.orders, args.cancel_rate, args.seed)
+    print(f"{result['events']} events, {result['fills']} fills, {result['resting']} resting orders in {result['elapsed']:.2f}s")
+    print(f"{result['events_per_sec']:.0f} events/sec, {result['matches_per_sec']:.0f} matches/sec")
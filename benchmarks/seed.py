@@ -0,0 +1,60 @@
+import random
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+from models import db, User, Stock, StockHistory, Transaction
+from holdings import reconcile_holdings
+from candles import rebuild_candles
+
+# Bulk-seeds a database for benchmarks. Rows are written with executemany in
+# batches; holdings and candles are then derived the same way production
+# rebuilds them.
+
+PASSWORD = 'benchmark'
+
+def _insert(model, rows, batch_size=5000):
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(model.__table__.insert(), rows[start:start + batch_size])
+
+def seed(users=100, stocks=200, transactions=50000, history=100, seed=1):
+    rng = random.Random(seed)
+    db.drop_all()
+    db.create_all()
+    password = generate_password_hash(PASSWORD)  # Hashing once keeps seeding fast
+    _insert(User, [
+        {'id': i, 'full_name': f'User {i}', 'username': f'user{i}', 'email': f'user{i}@example.com',
+         'password': password, 'cash_account': 1000000.0, 'is_admin': i == 1}
+        for i in range(1, users + 1)
+    ])
+    prices = {i: round(rng.uniform(5, 500), 2) for i in range(1, stocks + 1)}
+    _insert(Stock, [
+        {'id': i, 'company_name': f'Company {i}', 'ticker': f'T{i:05d}', 'volume': rng.randrange(1000, 1000000),
+         'initial_price': price, 'current_price': price, 'high_price': price, 'low_price': price}
+        for i, price in prices.items()
+    ])
+
+    now = datetime.now().replace(second=0, microsecond=0)
+    rows = []
+    for stock_id, price in prices.items():
+        for minute in range(history):
+            rows.append({'stock_id': stock_id, 'price': round(price * rng.uniform(0.95, 1.05), 2), 'timestamp': now - timedelta(minutes=history - minute)})
+    _insert(StockHistory, rows)
+
+    # Buys outnumber sells, and a sell larger than the position becomes a buy,
+    # so positions never go negative
+    rows = []
+    positions = {}
+    start = now - timedelta(days=365)
+    for i in range(transactions):
+        user_id, stock_id, amount = rng.randrange(1, users + 1), rng.randrange(1, stocks + 1), rng.randrange(1, 10)
+        position = positions.get((user_id, stock_id), 0)
+        transaction_type = 'sell' if rng.random() >= 0.7 and position >= amount else 'buy'
+        positions[(user_id, stock_id)] = position + (amount if transaction_type == 'buy' else -amount)
+        rows.append({
+            'user_id': user_id, 'stock_id': stock_id, 'transaction_type': transaction_type,
+            'amount': amount, 'price': prices[stock_id], 'timestamp': start + timedelta(seconds=i * 365 * 86400 // max(transactions, 1)),
+        })
+    _insert(Transaction, rows)
+    db.session.commit()
+    reconcile_holdings(fix=True)
+    rebuild_candles()
+    return {'users': users, 'stocks': stocks, 'transactions': transactions, 'history': stocks * history}
@@ -0,0 +1,51 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Times a cold start in fresh interpreters: a script or worker that only needs
+# the models and config (create_app(web=False)), and a web worker
+# (create_app()). Reports the median of --runs runs for each and the number
+# of threads left running. To get a baseline from an older checkout, run this
+# from that checkout with --baseline and the statement that starts it there.
+#
+# Usage: python -m benchmarks.startup [--runs N] [--baseline 'import app']
+
+TARGETS = {
+    'script': 'from app import create_app; create_app(web=False)',
+    'web': 'from app import create_app; create_app()',
+}
+
+TIMER = (
+    'import time; started = time.perf_counter(); {statement}; '
+    'import threading; print(time.perf_counter() - started, threading.active_count())'
+)
+
+def measure(statement, runs, env):
+    times, threads = [], 0
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', TIMER.format(statement=statement)],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout.split()
+        times.append(float(output[-2]))
+        threads = int(output[-1])
+    return statistics.median(times), threads
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure cold-start time.')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--baseline', help="time only this statement, e.g. 'import app' on an older checkout")
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=os.getcwd(), PYTHONDONTWRITEBYTECODE='0')
+    env.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'startup.db'))
+    targets = {'baseline': args.baseline} if args.baseline else TARGETS
+    for name, statement in targets.items():
+        elapsed, threads = measure(statement, args.runs, env)
+        print(f"{name:10} {elapsed * 1000:8.1f} ms  {threads} threads")
+
+if __name__ == '__main__':
+    main()
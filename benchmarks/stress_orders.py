@@ -0,0 +1,168 @@
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+# Fires concurrent buy, sell, cancel and withdraw requests (including
+# resubmitted idempotency keys) while settlement runs in a separate thread,
+# then checks the ledger invariants: no negative cash, no over-reserved or
+# negative holdings, holdings that match a replay of the transactions, one
+# order per idempotency key and conservation of money. Exits non-zero on any
+# violation.
+#
+# Usage: python -m benchmarks.stress_orders [--users N --stocks N --workers N
+#        --operations N --cash AMOUNT] [--database-url URL]
+
+def worker(app, worker_id, args, keys, lock, counts):
+    from benchmarks.seed import PASSWORD
+    from models import Order
+    import ledger
+
+    rng = random.Random(worker_id)
+    user_id = worker_id % args.users + 1
+    client = app.test_client()
+    client.post('/login', data={'username': f'user{user_id}', 'password': PASSWORD})
+    for _ in range(args.operations):
+        op = rng.random()
+        if op < 0.4:
+            with lock:
+                pool = keys.setdefault(user_id, [])
+                if pool and rng.random() < 0.3:
+                    key = rng.choice(pool)  # A resubmitted form
+                else:
+                    key = uuid.uuid4().hex
+                    pool.append(key)
+            response = client.post('/buy_stock', data={
+                'stock_id': rng.randrange(1, args.stocks + 1), 'amount': rng.randrange(1, 20), 'idempotency_key': key,
+            })
+        elif op < 0.7:
+            response = client.post('/sell_stock', data={
+                'stock_id': rng.randrange(1, args.stocks + 1), 'amount': rng.randrange(1, 20), 'idempotency_key': uuid.uuid4().hex,
+            })
+        elif op < 0.9:
+            with app.app_context():
+                pending = [order.id for order in Order.query.filter_by(user_id=user_id, status='pending').limit(20)]
+            if not pending:
+                continue
+            response = client.post(f'/cancel_order/{rng.choice(pending)}')
+        else:
+            amount = Decimal(rng.randrange(1, 500))
+            with app.app_context():
+                if ledger.withdraw(user_id, amount):
+                    with lock:
+                        counts['withdrawn'] += amount
+            continue
+        if response.status_code >= 400:
+            with lock:
+                counts['errors'] += 1
+
+def settler(app, stop, counts):
+    from settlement import settle_pending_orders
+    while not stop.is_set():
+        with app.app_context():
+            stats = settle_pending_orders(chunk_size=50)
+        counts['settled'] += stats['orders']
+        counts['failed_chunks'] += stats['failed_chunks']
+        time.sleep(0.01)
+
+def check(app, start_cash, counts):
+    from sqlalchemy import func
+    from models import db, User, Order, Holding, Transaction
+    from holdings import reconcile_holdings
+    from ledger import money
+
+    violations = []
+    with app.app_context():
+        negative = User.query.filter(User.cash_account < 0).count()
+        if negative:
+            violations.append(f"{negative} users with negative cash")
+        bad = Holding.query.filter((Holding.reserved > Holding.quantity) | (Holding.reserved < 0) | (Holding.quantity < 0)).count()
+        if bad:
+            violations.append(f"{bad} holdings with negative quantity or reserved above quantity")
+        mismatches = reconcile_holdings(fix=False)
+        if mismatches:
+            violations.append(f"{len(mismatches)} holdings differ from a replay of the transactions")
+        duplicates = db.session.query(Order.user_id, Order.idempotency_key).filter(Order.idempotency_key.isnot(None)) \
+            .group_by(Order.user_id, Order.idempotency_key).having(func.count() > 1).count()
+        if duplicates:
+            violations.append(f"{duplicates} idempotency keys with more than one order")
+
+        # Cash on hand plus cash reserved by open buys must equal what users
+        # started with, less withdrawals, less what they paid for settled buys,
+        # plus what they received for settled sells
+        cash = sum((user.cash_account for user in User.query), Decimal(0))
+        reserved = sum((money(Decimal(str(order.price)) * (order.amount - order.filled_amount))
+                        for order in Order.query.filter_by(status='pending', order_type='buy')), Decimal(0))
+        flows = Decimal(0)
+        for txn in Transaction.query.filter(Transaction.id > counts['last_transaction_id']):
+            value = money(Decimal(str(txn.price)) * txn.amount)
+            flows += value if txn.transaction_type == 'sell' else -value
+        expected = start_cash - counts['withdrawn'] + flows
+        if cash + reserved != expected:
+            violations.append(f"cash does not balance: {cash} on hand + {reserved} reserved != {expected} expected")
+    return violations
+
+def main():
+    parser = argparse.ArgumentParser(description='Stress concurrent order placement and settlement.')
+    parser.add_argument('--users', type=int, default=5)
+    parser.add_argument('--stocks', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=16, help='concurrent clients; several share each user')
+    parser.add_argument('--operations', type=int, default=100, help='operations per worker')
+    parser.add_argument('--cash', type=int, default=5000, help='starting cash per user')
+    parser.add_argument('--database-url', help='defaults to a temporary SQLite file')
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'stress.db')
+    os.environ.setdefault('SCHEDULER_ENABLED', '0')
+
+    from app import create_app
+    from benchmarks.seed import seed
+    from models import db, User, Transaction
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        # Writers queue on SQLite's database lock instead of failing immediately
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(app.config['SQLALCHEMY_ENGINE_OPTIONS'], connect_args={'timeout': 30})
+
+    with app.app_context():
+        seed(args.users, args.stocks, transactions=args.users * args.stocks * 10, history=5)
+        User.query.update({'cash_account': args.cash})
+        db.session.commit()
+        start_cash = Decimal(args.cash) * args.users
+        last_transaction_id = db.session.query(db.func.max(Transaction.id)).scalar() or 0
+
+    counts = {'withdrawn': Decimal(0), 'errors': 0, 'settled': 0, 'failed_chunks': 0, 'last_transaction_id': last_transaction_id}
+    keys, lock, stop = {}, threading.Lock(), threading.Event()
+    settle_thread = threading.Thread(target=settler, args=(app, stop, counts))
+    started = time.perf_counter()
+    settle_thread.start()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        list(pool.map(lambda worker_id: worker(app, worker_id, args, keys, lock, counts), range(args.workers)))
+    stop.set()
+    settle_thread.join()
+    with app.app_context():
+        from settlement import settle_pending_orders
+        counts['settled'] += settle_pending_orders()['orders']
+    elapsed = time.perf_counter() - started
+
+    print(f"{args.workers * args.operations} operations in {elapsed:.1f}s, {counts['settled']} orders settled, "
+          f"{counts['failed_chunks']} failed chunks, {counts['errors']} error responses")
+    violations = check(app, start_cash, counts)
+    if counts['errors']:
+        violations.append(f"{counts['errors']} requests failed")
+    for violation in violations:
+        print(f"VIOLATION: {violation}")
+    if violations:
+        raise SystemExit(1)
+    print("All invariants hold")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+from datetime import datetime, timedelta
+from models import db, StockHistory, StockCandle
+import logging
+
+logger = logging.getLogger(__name__)
+
+# OHLC rollups of stock_price_history. Every tick written to the raw table is
+# also folded into its 1-minute, 1-hour and 1-day candle, so history queries
+# over long windows read a few hundred candles instead of every raw tick.
+
+RESOLUTIONS = {
+    '1m': timedelta(minutes=1),
+    '1h': timedelta(hours=1),
+    '1d': timedelta(days=1),
+}
+
+def bucket_start(timestamp, resolution):
+    if resolution == '1m':
+        return timestamp.replace(second=0, microsecond=0)
+    if resolution == '1h':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    if resolution == '1d':
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown candle resolution: {resolution}")
+
+def record_ticks(ticks, timestamp):
+    # ticks is a list of (stock_id, price) pairs sharing one timestamp. Existing
+    # candles are read as plain rows and written back with bulk statements so a
+    # tick over thousands of stocks does not build thousands of ORM objects.
+    if not ticks:
+        return
+    stock_ids = {stock_id for stock_id, _ in ticks}
+    for resolution in RESOLUTIONS:
+        bucket = bucket_start(timestamp, resolution)
+        existing = {
+            row.stock_id: {'stock_id': row.stock_id, 'resolution': resolution, 'bucket_start': bucket,
+                           'high': row.high, 'low': row.low, 'close': row.close, 'tick_count': row.tick_count}
+            for row in db.session.query(
+                StockCandle.stock_id, StockCandle.high, StockCandle.low, StockCandle.close, StockCandle.tick_count
+            ).filter(
+                StockCandle.resolution == resolution,
+                StockCandle.bucket_start == bucket,
+                StockCandle.stock_id.in_(stock_ids),
+            )
+        }
+        created = {}
+        for stock_id, price in ticks:
+            candle = existing.get(stock_id) or created.get(stock_id)
+            if candle is None:
+                created[stock_id] = {
+                    'stock_id': stock_id, 'resolution': resolution, 'bucket_start': bucket,
+                    'open': price, 'high': price, 'low': price, 'close': price, 'tick_count': 1,
+                }
+                continue
+            candle['high'] = max(candle['high'], price)
+            candle['low'] = min(candle['low'], price)
+            candle['close'] = price
+            candle['tick_count'] += 1
+        if existing:
+            db.session.bulk_update_mappings(StockCandle, list(existing.values()))
+        if created:
+            db.session.bulk_insert_mappings(StockCandle, list(created.values()))
+
+def rebuild_candles(stock_id=None, batch_size=5000, since=None, force=False):
+    # Recompute candles from the raw history, e.g. after importing old ticks.
+    # since limits the rebuild to days from that date on. Compacted history
+    # (see retention.py) has fewer ticks than its candles counted, and
+    # rebuilding from it would lose buckets and undercount tick_count, so the
+    # rebuild raises ValueError when it finds any unless force is set.
+    candles = StockCandle.query
+    raw = db.session.query(StockHistory.stock_id, StockHistory.price, StockHistory.timestamp).filter(StockHistory.price.isnot(None))
+    if stock_id is not None:
+        candles = candles.filter(StockCandle.stock_id == stock_id)
+        raw = raw.filter(StockHistory.stock_id == stock_id)
+    if since is not None:
+        since = bucket_start(since, '1d')
+        candles = candles.filter(StockCandle.bucket_start >= since)
+        raw = raw.filter(StockHistory.timestamp >= since)
+    counted = {
+        (row.stock_id, row.bucket_start): row.tick_count
+        for row in candles.filter(StockCandle.resolution == '1d').with_entities(
+            StockCandle.stock_id, StockCandle.bucket_start, StockCandle.tick_count
+        )
+    }
+
+    rollup = {}
+    for row in raw.order_by(StockHistory.stock_id, StockHistory.timestamp, StockHistory.id).yield_per(batch_size):
+        for resolution in RESOLUTIONS:
+            key = (row.stock_id, resolution, bucket_start(row.timestamp, resolution))
+            candle = rollup.get(key)
+            if candle is None:
+                rollup[key] = {
+                    'stock_id': row.stock_id, 'resolution': resolution, 'bucket_start': key[2],
+                    'open': row.price, 'high': row.price, 'low': row.price, 'close': row.price, 'tick_count': 1,
+                }
+            else:
+                candle['high'] = max(candle['high'], row.price)
+                candle['low'] = min(candle['low'], row.price)
+                candle['close'] = row.price
+                candle['tick_count'] += 1
+    compacted = [
+        day for (candle_stock_id, day), tick_count in counted.items()
+        if tick_count > rollup.get((candle_stock_id, '1d', day), {}).get('tick_count', 0)
+    ]
+    if compacted:
+        message = f"History before {max(compacted) + RESOLUTIONS['1d']} has been compacted; its candles hold more ticks than remain"
+        if not force:
+            db.session.rollback()
+            raise ValueError(f"{message}. Rebuild from a later date, or force it to accept coarser candles.")
+        logger.warning(f"{message}; rebuilding anyway.")
+    candles.delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(StockCandle, list(rollup.values()))
+    db.session.commit()
+    logger.info(f"Rebuilt {len(rollup)} candles.")
+    return len(rollup)
+
+def candle_retention(config):
+    # Days each resolution is kept by retention.compact_history; 0 keeps it
+    return {'1m': config['HISTORY_CANDLE_MINUTE_DAYS'], '1h': config['HISTORY_CANDLE_HOURLY_DAYS']}
+
+def pick_resolution(start, end, max_points, retention=None, now=None):
+    # Finest resolution that still fits the window into max_points buckets and
+    # whose candles are still kept at start
+    window = end - start
+    now = now or datetime.now()
+    for resolution, step in RESOLUTIONS.items():
+        days = (retention or {}).get(resolution)
+        if days and start < bucket_start(now - timedelta(days=days), '1d'):
+            continue
+        if window / step <= max_points:
+            return resolution
+    return '1d'
+
+def history_query(stock_id, start, end, resolution):
+    if resolution == 'raw':
+        return StockHistory.query.filter(
+            StockHistory.stock_id == stock_id,
+            StockHistory.timestamp >= start,
+            StockHistory.timestamp < end,
+        ).order_by(StockHistory.timestamp.desc())
+    return StockCandle.query.filter(
+        StockCandle.stock_id == stock_id,
+        StockCandle.resolution == resolution,
+        StockCandle.bucket_start >= bucket_start(start, resolution),
+        StockCandle.bucket_start < end,
+    ).order_by(StockCandle.bucket_start.desc())
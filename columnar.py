@@ -0,0 +1,100 @@
+import os
+import re
+import shutil
+from datetime import timedelta
+import numpy as np
+from models import db, Stock, StockHistory, Transaction
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Columnar snapshots of the price history and transaction tables for offline
+# analysis (see analytics.py). Rows are streamed out in ticker/timestamp order
+# with yield_per, so only the partition being written is held in memory, and
+# each ticker and day becomes one directory of column files:
+#
+#   <root>/stock_price_history/ticker=ACME/date=2024-01-02/{timestamp,price}.npy
+#   <root>/transaction/ticker=ACME/date=2024-01-02/{timestamp,price,amount,side,user_id}.npy
+#
+# Plain .npy columns can be memory-mapped; with pyarrow installed the same
+# partitions can be written as part.parquet instead. Exports always cover
+# whole days, so re-exporting a range replaces its partitions exactly.
+
+FORMATS = ('npy', 'parquet')
+
+COLUMNS = {
+    'stock_price_history': {'timestamp': 'datetime64[us]', 'price': 'float64'},
+    'transaction': {'timestamp': 'datetime64[us]', 'price': 'float64', 'amount': 'int64', 'side': 'int8', 'user_id': 'int64'},
+}
+
+def partition_name(ticker):
+    # Tickers are free text; keep them safe as a single path component
+    return 'ticker=' + re.sub(r'[^A-Za-z0-9._-]', '_', ticker)
+
+def _rows(table, start, end):
+    if table == 'stock_price_history':
+        query = db.session.query(Stock.ticker, StockHistory.timestamp, StockHistory.price) \
+            .join(Stock, Stock.id == StockHistory.stock_id).filter(StockHistory.price.isnot(None))
+        model = StockHistory
+    else:
+        query = db.session.query(Stock.ticker, Transaction.timestamp, Transaction.price, Transaction.amount,
+                                 Transaction.transaction_type, Transaction.user_id) \
+            .join(Stock, Stock.id == Transaction.stock_id)
+        model = Transaction
+    if start is not None:
+        query = query.filter(model.timestamp >= start)
+    if end is not None:
+        query = query.filter(model.timestamp < end + timedelta(days=1))
+    return query.order_by(model.stock_id, model.timestamp, model.id)
+
+def _write_partition(path, columns, fmt):
+    tmp = path + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    if fmt == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        pq.write_table(pa.table(columns), os.path.join(tmp, 'part.parquet'))
+    else:
+        for name, values in columns.items():
+            np.save(os.path.join(tmp, name + '.npy'), values)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+
+def export_table(root, table, start=None, end=None, fmt='npy', batch_size=50000):
+    # start and end are dates (inclusive); returns (rows, partitions) written
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if table not in COLUMNS:
+        raise ValueError(f"Unknown export table: {table}")
+    dtypes = COLUMNS[table]
+    rows = partitions = 0
+    key, buffer = None, None
+
+    def flush():
+        ticker, day = key
+        path = os.path.join(root, table, partition_name(ticker), f'date={day.isoformat()}')
+        _write_partition(path, {name: np.array(buffer[name], dtype=dtype) for name, dtype in dtypes.items()}, fmt)
+
+    for row in _rows(table, start, end).yield_per(batch_size):
+        row_key = (row.ticker, row.timestamp.date())
+        if row_key != key:
+            if key is not None:
+                flush()
+                partitions += 1
+            key, buffer = row_key, {name: [] for name in dtypes}
+        buffer['timestamp'].append(row.timestamp)
+        buffer['price'].append(row.price)
+        if table == 'transaction':
+            buffer['amount'].append(row.amount)
+            buffer['side'].append(1 if row.transaction_type == 'buy' else -1)
+            buffer['user_id'].append(row.user_id)
+        rows += 1
+    if key is not None:
+        flush()
+        partitions += 1
+    logger.info(f"Exported {rows} {table} rows into {partitions} partitions under {root}.")
+    return rows, partitions
+
+def export_all(root, start=None, end=None, fmt='npy', batch_size=50000):
+    return {table: export_table(root, table, start, end, fmt, batch_size) for table in COLUMNS}
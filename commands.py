@@ -0,0 +1,67 @@
+from datetime import time
+import click
+from models import db, MarketHours
+
+# `flask` CLI commands (FLASK_APP=app, or FLASK_APP="app:create_app(web=False)"
+# to skip loading the web views). The init_*.py scripts call the same functions.
+
+DEFAULT_MARKET_HOURS = [
+    {'day_of_week': day, 'open_time': time(9, 30), 'close_time': time(16, 0)}
+    for day in ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday')
+]
+
+def init_db():
+    db.create_all()
+
+def init_market_hours():
+    for mh in DEFAULT_MARKET_HOURS:
+        market_hour = MarketHours.query.filter_by(day_of_week=mh['day_of_week']).first()
+        if not market_hour:
+            market_hour = MarketHours(day_of_week=mh['day_of_week'], open_time=mh['open_time'], close_time=mh['close_time'])
+            db.session.add(market_hour)
+    db.session.commit()
+
+def register_commands(app):
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create all tables."""
+        init_db()
+        click.echo("Database initialized!")
+
+    @app.cli.command('init-market-hours')
+    def init_market_hours_command():
+        """Add the default Monday-Friday market hours."""
+        init_market_hours()
+        click.echo("Market hours initialized!")
+
+    @app.cli.command('tick')
+    @click.option('--count', default=1, type=click.IntRange(min=1), help='Number of ticks to generate.')
+    def tick_command(count):
+        """Generate price ticks now, regardless of market hours."""
+        from stock_price_generator import update_stock_prices
+        for _ in range(count):
+            updates = update_stock_prices()
+        click.echo(f"Updated {len(updates)} stocks.")
+
+    @app.cli.command('import-stocks')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+    @click.option('--chunk-size', type=int, help='Rows per commit (default IMPORT_CHUNK_SIZE).')
+    def import_stocks_command(path, chunk_size):
+        """Create listings and record prices from a CSV file ('-' for stdin)."""
+        from flask import current_app
+        from stock_import import import_stocks
+        with click.open_file(path, encoding='utf-8-sig') as stream:
+            report = import_stocks(stream, chunk_size or current_app.config['IMPORT_CHUNK_SIZE'])
+        for line, ticker, message in report['errors']:
+            click.echo(f"line {line}: {ticker or '-'}: {message}", err=True)
+        click.echo(f"Imported {report['imported']} of {report['rows']} rows: {report['created']} created, "
+                   f"{report['updated']} updated, {report['ticks']} prices, {len(report['errors'])} errors.")
+        if report['errors']:
+            raise SystemExit(1)
+
+    @app.cli.command('settle')
+    def settle_command():
+        """Settle pending market orders."""
+        from settlement import settle_pending_orders
+        stats = settle_pending_orders()
+        click.echo(f"Settled {stats['orders']} orders in {stats['chunks']} chunks ({stats['failed_chunks']} failed).")
@@ -0,0 +1,29 @@
+import argparse
+from app import create_app
+from retention import compact_history
+
+app = create_app(web=False)
+
+# Usage: python compact_history.py [--raw-days N] [--hourly-days N] [--minute-candle-days N] [--hourly-candle-days N]
+#        [--batch-size N] [--full] [--dry-run]
+parser = argparse.ArgumentParser(description='Downsample old stock_price_history ticks and drop old fine-grained candles.')
+parser.add_argument('--raw-days', type=int, default=app.config['HISTORY_RAW_DAYS'])
+parser.add_argument('--hourly-days', type=int, default=app.config['HISTORY_HOURLY_DAYS'])
+parser.add_argument('--minute-candle-days', type=int, default=app.config['HISTORY_CANDLE_MINUTE_DAYS'])
+parser.add_argument('--hourly-candle-days', type=int, default=app.config['HISTORY_CANDLE_HOURLY_DAYS'], help='0 keeps 1h candles')
+parser.add_argument('--batch-size', type=int, default=app.config['HISTORY_COMPACTION_BATCH'])
+parser.add_argument('--lookback-days', type=int, default=app.config['HISTORY_COMPACTION_LOOKBACK_DAYS'])
+parser.add_argument('--full', action='store_true', help='sweep all history instead of the lookback window')
+parser.add_argument('--dry-run', action='store_true', help='report what would be deleted')
+args = parser.parse_args()
+
+with app.app_context():
+    stats = compact_history(
+        args.raw_days, args.hourly_days, args.batch_size, args.lookback_days, args.full, args.dry_run,
+        minute_days=args.minute_candle_days, hourly_candle_days=args.hourly_candle_days,
+    )
+    for resolution, stage in stats['stages'].items():
+        print(f"{resolution} stage ({stage['start'] or 'beginning'} to {stage['end']}): {stage['deleted']} of {stage['scanned']} rows reclaimed.")
+    for resolution, stage in stats['candles'].items():
+        print(f"{resolution} candles ({stage['start'] or 'beginning'} to {stage['end']}): {stage['deleted']} dropped.")
+    print(f"{'Would reclaim' if args.dry_run else 'Reclaimed'} {stats['deleted']} rows in {stats['elapsed']:.1f}s.")
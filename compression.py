@@ -0,0 +1,116 @@
+import gzip
+import threading
+from collections import OrderedDict
+from flask import request
+import logging
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Strong ETags and gzip/brotli compression for text responses. HTML pages
+# without an ETag get one from a digest of their body, so a repeat view that
+# renders the same bytes is answered with 304. Each encoding of a body gets its
+# own ETag ("<etag>-gzip", "<etag>-br"), since the bytes differ, and the
+# compressed bytes are kept per URL and ETag so an unchanged page is
+# compressed once. Views may tag several URLs alike (an ETag only has to be
+# unique per resource), so the ETag alone is not a safe key.
+# Streamed responses (price stream, CSV exports) pass through untouched.
+
+COMPRESSIBLE = {
+    'text/html', 'text/css', 'text/csv', 'text/plain', 'text/javascript',
+    'application/javascript', 'application/json', 'image/svg+xml',
+}
+ENCODINGS = ('br', 'gzip')
+
+class CompressedBodies:
+    # LRU of compressed bodies keyed on (URL, their encoding's ETag)
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, compress):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return body
+        self.misses += 1
+        body = compress()
+        with self._lock:
+            self._entries[key] = body
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return body
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+compressed_bodies = CompressedBodies()
+
+def pick_encoding():
+    accepted = request.accept_encodings
+    for encoding in ENCODINGS:
+        if encoding == 'br' and brotli is None:
+            continue
+        if accepted[encoding]:
+            return encoding
+    return None
+
+def compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(level, 11))
+    # mtime=0 keeps the header free of a timestamp, so one ETag always names the same bytes
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+def matching_etag(etag):
+    # The variant of etag (identity or an encoding) the client already holds, if any
+    for tag in (etag,) + tuple(f'{etag}-{encoding}' for encoding in ENCODINGS):
+        if request.if_none_match.contains(tag):
+            return tag
+    return None
+
+def init_compression(app):
+    if not app.config['COMPRESSION']:
+        return
+    min_size = app.config['COMPRESSION_MIN_SIZE']
+    level = app.config['COMPRESSION_LEVEL']
+
+    @app.after_request
+    def compress_response(response):
+        if (
+            request.method not in ('GET', 'HEAD') or response.status_code != 200
+            or response.direct_passthrough or response.is_streamed
+            or response.mimetype not in COMPRESSIBLE or 'Content-Encoding' in response.headers
+        ):
+            return response
+        if response.mimetype == 'text/html' and response.get_etag()[0] is None:
+            response.add_etag()
+            if 'Cache-Control' not in response.headers:
+                response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Accept-Encoding')
+        etag, weak = response.get_etag()
+        data = response.get_data()
+        encoding = pick_encoding() if len(data) >= min_size else None
+        if etag is not None and not weak:
+            tag = f'{etag}-{encoding}' if encoding else etag
+            response.set_etag(tag)
+            response.make_conditional(request)
+            if response.status_code == 304:
+                return response
+        if encoding is None:
+            return response
+        if etag is not None and not weak:
+            body = compressed_bodies.get((request.full_path, tag), lambda: compress(data, encoding, level))
+        else:
+            body = compress(data, encoding, level)
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        return response
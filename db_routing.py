@@ -0,0 +1,74 @@
+import sqlite3
+from contextlib import contextmanager
+from functools import wraps
+from flask import g, has_app_context, current_app
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import orm
+from sqlalchemy.engine.url import make_url
+
+# Read-replica routing. Views decorated with @read_only mark the request, and
+# while that mark is set the session sends statements to the 'replica' bind
+# (SQLALCHEMY_BINDS, configured from REPLICA_DATABASE_URL). Everything else,
+# including any flush, stays on the primary. With no replica configured the
+# decorator is a no-op. Replica reads may lag the primary slightly, so only
+# pages that tolerate that should be marked.
+
+class RoutingSession(SignallingSession):
+    def get_bind(self, mapper=None, clause=None):
+        if (
+            has_app_context()
+            and g.get('use_replica')
+            and not self._flushing
+            and 'replica' in (current_app.config.get('SQLALCHEMY_BINDS') or {})
+        ):
+            return get_state(self.app).db.get_engine(self.app, bind='replica')
+        return super().get_bind(mapper, clause)
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+def read_only(view):
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        g.use_replica = True
+        return view(*args, **kwargs)
+    return wrapped
+
+@contextmanager
+def primary():
+    # Force the primary inside a read-only request, e.g. to refill a shared
+    # cache that must not pick up replica lag
+    previous = g.get('use_replica') if has_app_context() else None
+    if has_app_context():
+        g.use_replica = False
+    try:
+        yield
+    finally:
+        if has_app_context():
+            g.use_replica = previous
+
+@contextmanager
+def replica():
+    # The read_only mark for code outside a view, e.g. exports run from the CLI
+    previous = g.get('use_replica')
+    g.use_replica = True
+    try:
+        yield
+    finally:
+        g.use_replica = previous
+
+def copy_sqlite_replica(app):
+    # Local stand-in for replication when both URIs are SQLite files: copies
+    # the primary into the replica file with SQLite's online backup API
+    primary = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    replica = make_url(app.config['SQLALCHEMY_BINDS']['replica'])
+    if primary.drivername != 'sqlite' or replica.drivername != 'sqlite':
+        raise ValueError('copy_sqlite_replica only works with two SQLite files')
+    source = sqlite3.connect(primary.database)
+    target = sqlite3.connect(replica.database)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
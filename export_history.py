@@ -0,0 +1,19 @@
+import argparse
+from datetime import date
+from app import create_app
+from columnar import FORMATS, export_all
+from db_routing import replica
+
+app = create_app(web=False)
+
+# Usage: python export_history.py [--format npy|parquet] [--start YYYY-MM-DD] [--end YYYY-MM-DD] [DIR]
+parser = argparse.ArgumentParser(description='Export price history and transactions partitioned by ticker and day.')
+parser.add_argument('root', nargs='?', default=app.config['EXPORT_DIR'])
+parser.add_argument('--format', choices=FORMATS, default=app.config['EXPORT_FORMAT'])
+parser.add_argument('--start', type=date.fromisoformat)
+parser.add_argument('--end', type=date.fromisoformat)
+args = parser.parse_args()
+
+with app.app_context(), replica():
+    for table, (rows, partitions) in export_all(args.root, args.start, args.end, args.format).items():
+        print(f"{table}: {rows} rows in {partitions} partitions.")
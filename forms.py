@@ -1,6 +1,6 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, IntegerField, FloatField, TimeField, BooleanField
-from wtforms.validators import DataRequired, Email, EqualTo
+from wtforms import StringField, PasswordField, SubmitField, IntegerField, FloatField, DecimalField, TimeField, BooleanField
+from wtforms.validators import DataRequired, Email, EqualTo, NumberRange
 
 class RegistrationForm(FlaskForm):
     full_name = StringField('Full Name', validators=[DataRequired()])
@@ -35,11 +35,11 @@ class MarketScheduleForm(FlaskForm):
     submit = SubmitField('Update')
 
 class AddCashForm(FlaskForm):
-    amount = FloatField('Amount', validators=[DataRequired()])
+    amount = DecimalField('Amount', places=2, validators=[DataRequired(), NumberRange(min=0.01)])
     submit = SubmitField('Add Cash')
 
 class WithdrawCashForm(FlaskForm):
-    amount = FloatField('Amount', validators=[DataRequired()])
+    amount = DecimalField('Amount', places=2, validators=[DataRequired(), NumberRange(min=0.01)])
     submit = SubmitField('Withdraw Cash')
 
 class UpdateProfileForm(FlaskForm):
@@ -0,0 +1,41 @@
+import threading
+from collections import OrderedDict
+
+# Rendered template fragments, shared by all requests in the process. Each
+# entry is stored with the version of the data it was rendered from; get()
+# returns it while the caller's version still matches and re-renders it
+# otherwise, so nothing needs explicit invalidation. Keys that stop being
+# requested (e.g. a delisted stock) age out of the LRU.
+
+class FragmentCache:
+    def __init__(self, max_entries=50000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, version, render):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+        self.misses += 1
+        fragment = render()
+        with self._lock:
+            self._entries[key] = (version, fragment)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return fragment
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+fragment_cache = FragmentCache()
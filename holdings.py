@@ -0,0 +1,121 @@
+from models import db, Holding, Transaction, Order
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Holdings are a materialized view of Transaction: one row per (user, stock) with
+# the net share count and the average-cost basis of those shares. They are
+# updated in the same session as the Transaction that changes them, so callers
+# commit both together. `reserved` counts shares promised to pending sell
+# orders (see ledger.py); a settled sell releases its reservation.
+
+def apply_fill(user_id, stock_id, transaction_type, amount, price):
+    holding = Holding.query.get((user_id, stock_id))
+    if holding is None:
+        holding = Holding(user_id=user_id, stock_id=stock_id, quantity=0, reserved=0, cost_basis=0.0)
+        db.session.add(holding)
+    _apply(holding, transaction_type, amount, price)
+    return holding
+
+def _apply(holding, transaction_type, amount, price):
+    if transaction_type == 'buy':
+        holding.quantity += amount
+        holding.cost_basis += amount * price
+    elif transaction_type == 'sell':
+        if holding.quantity > 0:
+            # Average cost: the sold shares take their proportional share of the basis
+            holding.cost_basis -= holding.cost_basis * min(amount, holding.quantity) / holding.quantity
+        holding.quantity -= amount
+        holding.reserved = max(0, (holding.reserved or 0) - amount)
+        if holding.quantity <= 0:
+            holding.cost_basis = 0.0
+
+def apply_fills(fills):
+    # Batched apply_fill: fills are (user_id, stock_id, transaction_type, amount, price)
+    # tuples. All touched holdings are loaded (and row-locked, so a concurrent
+    # sell reservation waits for this transaction) in one query and missing ones created.
+    fills = list(fills)
+    if not fills:
+        return {}
+    user_ids = {fill[0] for fill in fills}
+    stock_ids = {fill[1] for fill in fills}
+    holdings = {
+        (holding.user_id, holding.stock_id): holding
+        for holding in Holding.query.filter(Holding.user_id.in_(user_ids), Holding.stock_id.in_(stock_ids)).with_for_update().all()
+    }
+    for user_id, stock_id, transaction_type, amount, price in fills:
+        holding = holdings.get((user_id, stock_id))
+        if holding is None:
+            holding = holdings[(user_id, stock_id)] = Holding(user_id=user_id, stock_id=stock_id, quantity=0, reserved=0, cost_basis=0.0)
+            db.session.add(holding)
+        _apply(holding, transaction_type, amount, price)
+    return holdings
+
+def get_quantity(user_id, stock_id):
+    holding = Holding.query.get((user_id, stock_id))
+    return holding.quantity if holding else 0
+
+def replay_transactions(user_id=None, batch_size=1000):
+    # Rebuild positions from the full Transaction history in timestamp order
+    query = db.session.query(
+        Transaction.user_id, Transaction.stock_id, Transaction.transaction_type,
+        Transaction.amount, Transaction.price
+    )
+    if user_id is not None:
+        query = query.filter(Transaction.user_id == user_id)
+    query = query.order_by(Transaction.timestamp, Transaction.id).yield_per(batch_size)
+    positions = {}
+    for row in query:
+        key = (row.user_id, row.stock_id)
+        holding = positions.get(key)
+        if holding is None:
+            holding = positions[key] = Holding(user_id=row.user_id, stock_id=row.stock_id, quantity=0, reserved=0, cost_basis=0.0)
+        _apply(holding, row.transaction_type, row.amount or 0, row.price or 0.0)
+
+    # Reservations are whatever pending sell orders still need
+    pending = db.session.query(
+        Order.user_id, Order.stock_id, db.func.sum(Order.amount - Order.filled_amount)
+    ).filter(Order.order_type == 'sell', Order.status == 'pending')
+    if user_id is not None:
+        pending = pending.filter(Order.user_id == user_id)
+    for order_user_id, stock_id, reserved in pending.group_by(Order.user_id, Order.stock_id):
+        holding = positions.get((order_user_id, stock_id))
+        if holding is not None:
+            holding.reserved = int(reserved or 0)
+    return positions
+
+def reconcile_holdings(user_id=None, fix=True):
+    expected = replay_transactions(user_id)
+    query = Holding.query
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+    current = {(h.user_id, h.stock_id): h for h in query.all()}
+
+    mismatches = []
+    for key in set(expected) | set(current):
+        want = expected.get(key)
+        have = current.get(key)
+        want_qty = want.quantity if want else 0
+        want_reserved = want.reserved if want else 0
+        want_basis = round(want.cost_basis, 6) if want else 0.0
+        have_qty = have.quantity if have else 0
+        have_reserved = have.reserved if have else 0
+        have_basis = round(have.cost_basis, 6) if have else 0.0
+        if want_qty == have_qty and want_reserved == have_reserved and want_basis == have_basis:
+            continue
+        mismatches.append({'user_id': key[0], 'stock_id': key[1], 'expected': want_qty, 'actual': have_qty})
+        if not fix:
+            continue
+        if have is None:
+            db.session.add(Holding(user_id=key[0], stock_id=key[1], quantity=want_qty, reserved=want_reserved, cost_basis=want_basis))
+        elif want is None:
+            db.session.delete(have)
+        else:
+            have.quantity = want_qty
+            have.reserved = want_reserved
+            have.cost_basis = want.cost_basis
+
+    if fix:
+        db.session.commit()
+    logger.info(f"Reconciled holdings for {len(expected)} positions, {len(mismatches)} mismatches{' fixed' if fix else ''}.")
+    return mismatches
@@ -1,6 +1,6 @@
-from app import app
-from models import db
+from app import create_app
+from commands import init_db
 
-with app.app_context():
-    db.create_all()
+with create_app(web=False).app_context():
+    init_db()
     print("Database initialized!")
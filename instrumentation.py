@@ -0,0 +1,156 @@
+import heapq
+import threading
+import time
+from contextlib import contextmanager
+from collections import defaultdict
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Opt-in (SQL_INSTRUMENTATION=1) per-request and per-job SQL accounting. Engine
+# events attribute every statement to the scope active on the current thread;
+# when a scope ends its totals go to the response headers, the aggregate
+# counters served by /metrics, and the log if it crossed the slow thresholds.
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class Scope:
+    __slots__ = ('name', 'started', 'queries', 'sql_time', 'slowest', 'keep')
+
+    def __init__(self, name, keep):
+        self.name = name
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.slowest = []  # min-heap of (duration, statement)
+        self.keep = keep
+
+    def record(self, statement, duration):
+        self.queries += 1
+        self.sql_time += duration
+        if len(self.slowest) < self.keep:
+            heapq.heappush(self.slowest, (duration, statement))
+        elif duration > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (duration, statement))
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = defaultdict(int)
+        self.duration = defaultdict(float)
+        self.queries = defaultdict(int)
+        self.sql_time = defaultdict(float)
+        self.buckets = defaultdict(lambda: [0] * len(REQUEST_BUCKETS))
+
+    def observe(self, name, duration, scope):
+        with self._lock:
+            self.count[name] += 1
+            self.duration[name] += duration
+            self.queries[name] += scope.queries
+            self.sql_time[name] += scope.sql_time
+            buckets = self.buckets[name]
+            for i, bound in enumerate(REQUEST_BUCKETS):
+                if duration <= bound:
+                    buckets[i] += 1
+
+    def render(self, extra=None):
+        lines = [
+            '# HELP stockapp_duration_seconds Request and job duration.',
+            '# TYPE stockapp_duration_seconds histogram',
+        ]
+        with self._lock:
+            names = sorted(self.count)
+            for name in names:
+                for bound, value in zip(REQUEST_BUCKETS, self.buckets[name]):
+                    lines.append(f'stockapp_duration_seconds_bucket{{name="{name}",le="{bound}"}} {value}')
+                lines.append(f'stockapp_duration_seconds_bucket{{name="{name}",le="+Inf"}} {self.count[name]}')
+                lines.append(f'stockapp_duration_seconds_sum{{name="{name}"}} {self.duration[name]:.6f}')
+                lines.append(f'stockapp_duration_seconds_count{{name="{name}"}} {self.count[name]}')
+            lines.append('# HELP stockapp_sql_queries_total SQL statements issued.')
+            lines.append('# TYPE stockapp_sql_queries_total counter')
+            for name in names:
+                lines.append(f'stockapp_sql_queries_total{{name="{name}"}} {self.queries[name]}')
+            lines.append('# HELP stockapp_sql_seconds_total Time spent executing SQL.')
+            lines.append('# TYPE stockapp_sql_seconds_total counter')
+            for name in names:
+                lines.append(f'stockapp_sql_seconds_total{{name="{name}"}} {self.sql_time[name]:.6f}')
+        for metric, (kind, value) in (extra or {}).items():
+            lines.append(f'# TYPE {metric} {kind}')
+            lines.append(f'{metric} {value}')
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+_local = threading.local()
+_settings = {'slow_ms': 500, 'slow_queries': 50, 'keep': 3}
+
+def current_scope():
+    return getattr(_local, 'scope', None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_start'].pop()
+    scope = current_scope()
+    if scope is not None:
+        scope.record(statement, time.perf_counter() - started)
+
+def begin(name):
+    _local.scope = Scope(name, _settings['keep'])
+    return _local.scope
+
+def end():
+    scope = current_scope()
+    _local.scope = None
+    if scope is None:
+        return None
+    duration = time.perf_counter() - scope.started
+    metrics.observe(scope.name, duration, scope)
+    if duration * 1000 > _settings['slow_ms'] or scope.queries > _settings['slow_queries']:
+        slowest = '; '.join(f"{1000 * d:.1f} ms: {s[:200]}" for d, s in sorted(scope.slowest, reverse=True))
+        logger.warning(f"Slow {scope.name}: {1000 * duration:.1f} ms, {scope.queries} queries, {1000 * scope.sql_time:.1f} ms in SQL. Slowest: {slowest}")
+    return scope, duration
+
+@contextmanager
+def track(name):
+    # For background jobs; a no-op unless instrumentation is enabled
+    if not _settings.get('enabled'):
+        yield None
+        return
+    scope = begin(name)
+    try:
+        yield scope
+    finally:
+        end()
+
+def init_instrumentation(app, web=True):
+    # Jobs are tracked in every process; the request hooks are web-only
+    if not app.config['SQL_INSTRUMENTATION']:
+        return
+    _settings.update(
+        enabled=True,
+        slow_ms=app.config['SLOW_REQUEST_MS'],
+        slow_queries=app.config['SLOW_REQUEST_QUERIES'],
+    )
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    if not web:
+        return
+
+    @app.before_request
+    def start_request_scope():
+        from flask import request
+        begin(f"request:{request.endpoint}")
+
+    @app.after_request
+    def finish_request_scope(response):
+        result = end()
+        if result is not None:
+            scope, duration = result
+            response.headers['X-SQL-Queries'] = str(scope.queries)
+            response.headers['X-SQL-Time-ms'] = f"{1000 * scope.sql_time:.2f}"
+            response.headers['X-Request-Time-ms'] = f"{1000 * duration:.2f}"
+        return response
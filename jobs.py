@@ -0,0 +1,66 @@
+from flask import current_app
+from market_calendar import market_calendar
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Background job bodies. Each runs inside an app context pushed by
+# scheduler.run_job (or a CLI command) and imports what it needs on first
+# use, so loading the job list costs nothing for processes that never run one.
+
+def market_closed():
+    return current_app.config['MARKET_HOURS_GATING'] and not market_calendar.is_open()
+
+def process_pending_orders_job():
+    from settlement import settle_pending_orders
+    stats = settle_pending_orders()
+    if stats['failed_chunks']:
+        logger.error("Automatic processing of pending orders failed.")
+    else:
+        logger.info("Pending orders processed automatically.")
+    return stats
+
+def price_tick_job():
+    from stock_price_generator import update_stock_prices
+    if market_closed():
+        logger.debug("Market closed, skipping price update.")
+        return 'skipped'
+    update_stock_prices()
+
+def settlement_job():
+    from settlement import SettlementError
+    if market_closed():
+        logger.debug("Market closed, skipping order settlement.")
+        return 'skipped'
+    stats = process_pending_orders_job()
+    if stats['failed_chunks']:
+        # Raised so scheduler.run_job records the run as an error with this message
+        raise SettlementError(
+            f"{stats['failed_chunks']} settlement chunks failed; {stats['orders']} orders settled in {stats['chunks']} chunks"
+        )
+
+def matching_job():
+    from matching import matching_engine
+    if market_closed():
+        return 'skipped'
+    matching_engine.sync()
+
+def history_compaction_job():
+    from retention import compact_history
+    config = current_app.config
+    return compact_history(
+        raw_days=config['HISTORY_RAW_DAYS'], hourly_days=config['HISTORY_HOURLY_DAYS'],
+        batch_size=config['HISTORY_COMPACTION_BATCH'], lookback_days=config['HISTORY_COMPACTION_LOOKBACK_DAYS'],
+        minute_days=config['HISTORY_CANDLE_MINUTE_DAYS'], hourly_candle_days=config['HISTORY_CANDLE_HOURLY_DAYS'],
+    )
+
+def scheduled_jobs(config):
+    # (name, func, interval_seconds) for scheduler.start_scheduler
+    jobs = [
+        ('price_tick', price_tick_job, 60),  # Update stock prices every minute
+        ('settlement', settlement_job, 60),  # Settle pending orders every minute
+        ('matching', matching_job, config['MATCHING_INTERVAL']),  # Match new limit orders
+    ]
+    if config['HISTORY_COMPACTION']:
+        jobs.append(('history_compaction', history_compaction_job, config['HISTORY_COMPACTION_INTERVAL']))
+    return jobs
@@ -0,0 +1,138 @@
+import math
+from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy import bindparam
+from sqlalchemy.exc import IntegrityError
+from models import db, User, Order, Holding
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Cash and share movements that must be safe under concurrent requests. Every
+# balance check is folded into the UPDATE that changes the balance
+# ("... WHERE cash_account >= :cost"), so two requests can never both spend
+# the same money or sell the same shares. Placement reserves what the order
+# needs: buys take cash up front and sells reserve shares on the holding.
+# Settlement then only moves what was reserved, and cancelling releases it.
+
+CENT = Decimal('0.01')
+
+class OrderError(Exception):
+    pass
+
+def money(value):
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+def reserve_cash(user_id, amount):
+    table = User.__table__
+    result = db.session.execute(
+        table.update()
+        .where(table.c.id == user_id)
+        .where(table.c.cash_account >= amount)
+        .values(cash_account=table.c.cash_account - amount)
+    )
+    return result.rowcount == 1
+
+def credit_cash(user_id, amount):
+    table = User.__table__
+    db.session.execute(table.update().where(table.c.id == user_id).values(cash_account=table.c.cash_account + amount))
+
+def credit_cash_many(deltas):
+    # deltas maps user_id to a (possibly negative) Decimal; one executemany
+    rows = [{'uid': user_id, 'delta': money(delta)} for user_id, delta in deltas.items() if delta]
+    if not rows:
+        return
+    table = User.__table__
+    db.session.execute(
+        table.update().where(table.c.id == bindparam('uid')).values(cash_account=table.c.cash_account + bindparam('delta', type_=table.c.cash_account.type)),
+        rows,
+    )
+
+def reserve_shares(user_id, stock_id, amount):
+    table = Holding.__table__
+    result = db.session.execute(
+        table.update()
+        .where(table.c.user_id == user_id)
+        .where(table.c.stock_id == stock_id)
+        .where(table.c.quantity - table.c.reserved >= amount)
+        .values(reserved=table.c.reserved + amount)
+    )
+    return result.rowcount == 1
+
+def release_shares(user_id, stock_id, amount):
+    table = Holding.__table__
+    db.session.execute(
+        table.update()
+        .where(table.c.user_id == user_id)
+        .where(table.c.stock_id == stock_id)
+        .values(reserved=db.case((table.c.reserved > amount, table.c.reserved - amount), else_=0))
+    )
+
+def place_order(user_id, stock, order_type, amount, limit_price=None, idempotency_key=None):
+    # Reserves and inserts in the caller's transaction and commits. A repeated
+    # idempotency key returns the order created by the first request.
+    if amount <= 0:
+        raise OrderError('Amount must be positive.')
+    if limit_price is not None and not (math.isfinite(limit_price) and limit_price > 0):
+        raise OrderError('Limit price must be a positive number.')
+    if idempotency_key:
+        existing = Order.query.filter_by(user_id=user_id, idempotency_key=idempotency_key).first()
+        if existing is not None:
+            return existing
+    price = limit_price if limit_price is not None else stock.current_price
+    if order_type == 'buy':
+        if not reserve_cash(user_id, money(Decimal(str(price)) * amount)):
+            db.session.rollback()
+            raise OrderError('You do not have enough money to place this order.')
+    elif order_type == 'sell':
+        if not reserve_shares(user_id, stock.id, amount):
+            db.session.rollback()
+            raise OrderError('You do not have enough stock to sell.')
+    else:
+        raise OrderError(f"Unknown order type: {order_type}")
+    order = Order(
+        user_id=user_id, stock_id=stock.id, order_type=order_type, order_kind='market' if limit_price is None else 'limit',
+        amount=amount, price=price, status='pending', idempotency_key=idempotency_key,
+    )
+    db.session.add(order)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent request with the same key won; its reservation stands, ours is rolled back
+        db.session.rollback()
+        existing = Order.query.filter_by(user_id=user_id, idempotency_key=idempotency_key).first()
+        if existing is None:
+            raise
+        return existing
+    return order
+
+def cancel_order(order):
+    # Returns False if the order was no longer pending (settled or already cancelled)
+    table = Order.__table__
+    result = db.session.execute(
+        table.update().where(table.c.id == order.id).where(table.c.status == 'pending').values(status='cancelled')
+    )
+    if result.rowcount != 1:
+        db.session.rollback()
+        return False
+    db.session.refresh(order)
+    remaining = order.amount - order.filled_amount
+    if order.order_type == 'buy':
+        credit_cash(order.user_id, money(Decimal(str(order.price)) * remaining))
+    else:
+        release_shares(order.user_id, order.stock_id, remaining)
+    db.session.commit()
+    return True
+
+def deposit(user_id, amount):
+    credit_cash(user_id, money(amount))
+    db.session.commit()
+
+def withdraw(user_id, amount):
+    ok = reserve_cash(user_id, money(amount))
+    if ok:
+        db.session.commit()
+    else:
+        db.session.rollback()
+    return ok
@@ -0,0 +1,64 @@
+import csv
+import io
+from datetime import date, datetime, timedelta
+from models import db
+from quote_cache import quote_cache
+
+# Keyset pagination for per-user history listings (transactions, orders).
+# Rows are ordered newest first by (timestamp, id) and a page is requested
+# with the cursor of the last row already shown, so every page is an index
+# range scan on (user_id, timestamp, id) no matter how deep the user pages.
+
+def encode_cursor(row):
+    return f"{row.timestamp.isoformat()}_{row.id}"
+
+def decode_cursor(cursor):
+    timestamp, row_id = cursor.rsplit('_', 1)
+    return datetime.fromisoformat(timestamp), int(row_id)
+
+def parse_end(value):
+    # A date-only end (from <input type="date">) includes that whole day
+    try:
+        return datetime.combine(date.fromisoformat(value), datetime.min.time()) + timedelta(days=1)
+    except ValueError:
+        return datetime.fromisoformat(value)
+
+def apply_filters(query, model, args, type_column, status_column=None):
+    # Raises ValueError on malformed dates so the route can answer 400
+    ticker = args.get('ticker', '').strip().upper()
+    if ticker:
+        quote = quote_cache.get_by_ticker(ticker)
+        query = query.filter(model.stock_id == quote['id'] if quote else db.false())
+    if args.get('type'):
+        query = query.filter(type_column == args['type'])
+    if status_column is not None and args.get('status'):
+        query = query.filter(status_column == args['status'])
+    if args.get('start'):
+        query = query.filter(model.timestamp >= datetime.fromisoformat(args['start']))
+    if args.get('end'):
+        query = query.filter(model.timestamp < parse_end(args['end']))
+    return query
+
+def keyset_page(query, model, cursor, per_page):
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        query = query.filter(db.or_(
+            model.timestamp < timestamp,
+            db.and_(model.timestamp == timestamp, model.id < row_id),
+        ))
+    rows = query.order_by(model.timestamp.desc(), model.id.desc()).limit(per_page + 1).all()
+    next_cursor = encode_cursor(rows[per_page - 1]) if len(rows) > per_page else None
+    return rows[:per_page], next_cursor
+
+def stream_csv(query, header, batch_size=1000):
+    # query must select plain columns; rows are fetched in batches and written
+    # out one line at a time, so the export never holds the whole history
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    yield buffer.getvalue()
+    for row in query.yield_per(batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+        yield buffer.getvalue()
@@ -0,0 +1,72 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from models import MarketHours, MarketSchedule
+import logging
+
+logger = logging.getLogger(__name__)
+
+DAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+# In-memory copy of MarketHours and the MarketSchedule closures. is_open() is a
+# dict lookup plus a time comparison. Admin edits call invalidate(); the TTL
+# picks up edits made through another process. With no MarketHours rows at
+# all the market is treated as always open, as it was before hours existed.
+
+class MarketCalendar:
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._hours = None
+        self._closed_dates = set()
+        self._loaded_at = 0.0
+
+    def _ensure_loaded(self):
+        if self._hours is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return
+        with self._lock:
+            if self._hours is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return
+            hours = {}
+            for row in MarketHours.query.all():
+                day = (row.day_of_week or '').strip().lower()
+                if day in DAYS and row.open_time and row.close_time:
+                    hours[DAYS.index(day)] = (row.open_time, row.close_time)
+            self._closed_dates = {row.date for row in MarketSchedule.query.filter_by(is_closed=True).all()}
+            self._hours = hours
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._hours = None
+
+    def is_open(self, at=None):
+        self._ensure_loaded()
+        at = at or datetime.now()
+        if not self._hours:
+            return True
+        if at.date() in self._closed_dates:
+            return False
+        session = self._hours.get(at.weekday())
+        return session is not None and session[0] <= at.time() < session[1]
+
+    def next_open(self, at=None):
+        # Start of the next trading session after `at`; `at` itself if already open
+        self._ensure_loaded()
+        at = at or datetime.now()
+        if self.is_open(at):
+            return at
+        if not self._hours:
+            return at
+        day = at.date()
+        for offset in range(366 + 7):
+            date = day + timedelta(days=offset)
+            session = self._hours.get(date.weekday())
+            if session is None or date in self._closed_dates:
+                continue
+            opens = datetime.combine(date, session[0])
+            if opens > at:
+                return opens
+        return None
+
+market_calendar = MarketCalendar()
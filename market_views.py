@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+from flask import Blueprint, current_app, render_template, request, abort, Response
+from markupsafe import Markup
+from models import Stock
+from quote_cache import quote_cache
+from fragment_cache import fragment_cache
+from price_stream import price_bus, quote_poller, stream_events
+from db_routing import read_only
+from candles import RESOLUTIONS, candle_retention, pick_resolution, history_query
+from instrumentation import metrics
+
+# Public pages: listings, quotes, price history and the live price stream.
+
+market = Blueprint('market', __name__)
+
+@market.route('/')
+@read_only
+def index():
+    # The whole table is reused until a quote changes; after that only the rows whose quote changed are re-rendered
+    rows = fragment_cache.get('stock_rows', quote_cache.version(), render_stock_rows)
+    return render_template('index.html', rows=rows)
+
+def render_stock_rows():
+    template = current_app.jinja_env.get_template('_stock_row.html')
+    return Markup(''.join(
+        fragment_cache.get(('stock_row', quote['id']), quote_cache.row_version(quote['id']), lambda: template.render(stock=quote))
+        for quote in quote_cache.all()
+    ))
+
+@market.route('/view_stock/<int:stock_id>')
+@read_only
+def view_stock(stock_id):
+    stock = quote_cache.get(stock_id)
+    if stock is None:
+        abort(404)
+    return render_template(
+        'view_stock.html',
+        stock=stock,
+        high_price=stock['high_price'],
+        low_price=stock['low_price']
+    )
+
+@market.route('/stock_history/<int:stock_id>')
+@read_only
+def stock_history(stock_id):
+    stock = Stock.query.get_or_404(stock_id)
+    try:
+        end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else datetime.now()
+        start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else end - timedelta(days=1)
+    except ValueError:
+        abort(400)
+    if start >= end:
+        abort(400)
+    resolution = request.args.get('resolution', 'auto')
+    if resolution == 'auto':
+        resolution = pick_resolution(start, end, current_app.config['HISTORY_MAX_POINTS'], candle_retention(current_app.config))
+    elif resolution != 'raw' and resolution not in RESOLUTIONS:
+        abort(400)
+    page = request.args.get('page', 1, type=int)
+    history = history_query(stock.id, start, end, resolution).paginate(page=page, per_page=current_app.config['HISTORY_PER_PAGE'], error_out=False)
+    return render_template('stock_history.html', stock=stock, history=history, resolution=resolution, start=start, end=end)
+
+@market.route('/stream/prices')
+def stream_prices():
+    # Server-Sent Events: ?tickers=AAPL,MSFT limits the stream, otherwise every ticker is sent
+    tickers = [ticker for ticker in request.args.get('tickers', '').upper().split(',') if ticker]
+    quote_poller.ensure_started(current_app._get_current_object())
+    subscription = price_bus.subscribe(tickers)
+    snapshot = [
+        {'ticker': quote['ticker'], 'price': quote['current_price'], 'high': quote['high_price'], 'low': quote['low_price']}
+        for quote in quote_cache.all() if subscription.wants(quote['ticker'])
+    ]
+    # Not wrapped in stream_with_context: the generator needs no request state, and
+    # letting the app context end releases the DB session for the life of the stream
+    response = Response(stream_events(subscription, snapshot, current_app.config['STREAM_HEARTBEAT']), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@market.route('/metrics')
+def metrics_endpoint():
+    if not current_app.config['SQL_INSTRUMENTATION']:
+        abort(404)
+    cache_stats = quote_cache.stats()
+    fragment_stats = fragment_cache.stats()
+    extra = {
+        'stockapp_quote_cache_hits_total': ('counter', cache_stats['hits']),
+        'stockapp_quote_cache_misses_total': ('counter', cache_stats['misses']),
+        'stockapp_fragment_cache_hits_total': ('counter', fragment_stats['hits']),
+        'stockapp_fragment_cache_misses_total': ('counter', fragment_stats['misses']),
+        'stockapp_price_stream_subscribers': ('gauge', price_bus.subscriber_count()),
+    }
+    return Response(metrics.render(extra), mimetype='text/plain; version=0.0.4')
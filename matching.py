@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+from models import db, Transaction, Order
+from holdings import apply_fills
+from ledger import credit_cash_many
+from performance import performance_cache
+from order_book import OrderBook
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Keeps one OrderBook per stock for pending limit orders and matches new ones
+# as they arrive. Orders are placed by the web routes as ordinary Order rows;
+# sync() (run by the scheduler leader) feeds every pending limit order it has
+# not fed yet into the books and persists the resulting fills in one DB
+# transaction. It compares ids rather than keeping a high-water id, since ids
+# are handed out before commit: an order with a lower id can become visible
+# after a higher one was synced. The same comparison takes orders that were
+# cancelled (or settled) in any process off the books, so cancelling only has
+# to update the Order row.
+#
+# Buy limit orders reserve amount * limit price at placement, so a fill at a
+# better price refunds the difference and cancelling refunds what is unfilled.
+# If a resting order turns out to have been cancelled in the meantime, the
+# sync is rolled back and the books are rebuilt from the pending orders.
+
+class MatchingEngine:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.books = None
+        self.fed = {}  # order_id -> stock_id of every order fed to the books
+
+    def rebuild(self):
+        self.books = defaultdict(OrderBook)
+        self.fed = {}
+        orders = Order.query.filter_by(order_kind='limit', status='pending').order_by(Order.timestamp, Order.id).all()
+        fills = self._feed(orders)
+        logger.info(f"Rebuilt order books from {len(orders)} pending limit orders.")
+        return fills
+
+    def _feed(self, orders):
+        fills = []
+        for order in orders:
+            fills.extend(self.books[order.stock_id].add(
+                order.id, order.user_id, order.order_type, order.price, order.amount - (order.filled_amount or 0)
+            ))
+            self.fed[order.id] = order.stock_id
+        return fills
+
+    def sync(self):
+        with self._lock:
+            started = time.perf_counter()
+            if self.books is None:
+                fills = self.rebuild()
+            else:
+                pending = {order_id for order_id, in db.session.query(Order.id).filter(
+                    Order.order_kind == 'limit', Order.status == 'pending'
+                )}
+                for order_id in self.fed.keys() - pending:
+                    # Cancelled since it was fed; a no-op if it already filled here
+                    self.books[self.fed.pop(order_id)].cancel(order_id)
+                new = pending - self.fed.keys()
+                orders = Order.query.filter(Order.id.in_(new)).order_by(Order.timestamp, Order.id).all() if new else []
+                fills = self._feed(orders)
+            try:
+                persist_fills(fills)
+                db.session.commit()
+            except StaleOrderError as e:
+                db.session.rollback()
+                self.books = None
+                logger.warning(f"{e}; order books will be rebuilt.")
+                return []
+            except Exception:
+                # _feed already took the fills off the books; rebuild them from the database next time
+                db.session.rollback()
+                self.books = None
+                raise
+            if fills:
+                elapsed = time.perf_counter() - started
+                logger.info(f"Matched {len(fills)} fills in {1000 * elapsed:.1f} ms")
+            return fills
+
+class StaleOrderError(Exception):
+    pass
+
+def persist_fills(fills):
+    if not fills:
+        return
+    order_fills = defaultdict(int)
+    for fill in fills:
+        order_fills[fill.buy_order_id] += fill.amount
+        order_fills[fill.sell_order_id] += fill.amount
+    orders = {order.id: order for order in Order.query.filter(Order.id.in_(order_fills.keys())).all()}
+
+    table = Order.__table__
+    for order_id, amount in order_fills.items():
+        # Conditional update: fails if the order was cancelled or filled elsewhere
+        result = db.session.execute(
+            table.update()
+            .where(table.c.id == order_id)
+            .where(table.c.status == 'pending')
+            .where(table.c.amount - table.c.filled_amount >= amount)
+            .values(
+                filled_amount=table.c.filled_amount + amount,
+                status=db.case((table.c.filled_amount + amount >= table.c.amount, 'completed'), else_='pending'),
+            )
+        )
+        if result.rowcount != 1:
+            raise StaleOrderError(f"Order {order_id} is no longer open")
+
+    cash_deltas = defaultdict(Decimal)
+    transactions = []
+    holding_fills = []
+    for fill in fills:
+        buy_order = orders[fill.buy_order_id]
+        stock_id = buy_order.stock_id
+        # The buyer reserved the limit price at placement; return the price improvement
+        cash_deltas[fill.buy_user_id] += (Decimal(str(buy_order.price)) - Decimal(str(fill.price))) * fill.amount
+        cash_deltas[fill.sell_user_id] += Decimal(str(fill.price)) * fill.amount
+        transactions.append({'user_id': fill.buy_user_id, 'stock_id': stock_id, 'amount': fill.amount, 'price': fill.price, 'transaction_type': 'buy'})
+        transactions.append({'user_id': fill.sell_user_id, 'stock_id': stock_id, 'amount': fill.amount, 'price': fill.price, 'transaction_type': 'sell'})
+        holding_fills.append((fill.buy_user_id, stock_id, 'buy', fill.amount, fill.price))
+        holding_fills.append((fill.sell_user_id, stock_id, 'sell', fill.amount, fill.price))
+
+    credit_cash_many(cash_deltas)
+    db.session.bulk_insert_mappings(Transaction, transactions)
+    apply_fills(holding_fills)
+    performance_cache.invalidate(cash_deltas.keys())
+
+matching_engine = MatchingEngine()
@@ -1,6 +1,6 @@
-from flask_sqlalchemy import SQLAlchemy
+from db_routing import RoutingSQLAlchemy
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -8,7 +8,7 @@ class User(db.Model):
     username = db.Column(db.String(50), unique=True)
     email = db.Column(db.String(100), unique=True)
     password = db.Column(db.String(200))
-    cash_account = db.Column(db.Float, default=0.0)
+    cash_account = db.Column(db.Numeric(18, 2), nullable=False, default=0)
     is_admin = db.Column(db.Boolean, default=False)
     transactions = db.relationship('Transaction', backref='user', lazy=True)
     orders = db.relationship('Order', backref='user', lazy=True)
@@ -27,12 +27,25 @@ class Stock(db.Model):
 
 class StockHistory(db.Model):
     __tablename__ = 'stock_price_history'
+    __table_args__ = (db.Index('ix_stock_price_history_stock_id_timestamp', 'stock_id', 'timestamp'),)
     id = db.Column(db.Integer, primary_key=True)
     stock_id = db.Column(db.Integer, db.ForeignKey('stock.id'))
     price = db.Column(db.Float)
     timestamp = db.Column(db.DateTime, default=db.func.current_timestamp())
 
+class StockCandle(db.Model):
+    __tablename__ = 'stock_price_candle'
+    stock_id = db.Column(db.Integer, db.ForeignKey('stock.id'), primary_key=True)
+    resolution = db.Column(db.String(3), primary_key=True)  # '1m', '1h' or '1d'
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    open = db.Column(db.Float, nullable=False)
+    high = db.Column(db.Float, nullable=False)
+    low = db.Column(db.Float, nullable=False)
+    close = db.Column(db.Float, nullable=False)
+    tick_count = db.Column(db.Integer, nullable=False, default=0)
+
 class Transaction(db.Model):
+    __table_args__ = (db.Index('ix_transaction_user_id_timestamp_id', 'user_id', 'timestamp', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     stock_id = db.Column(db.Integer, db.ForeignKey('stock.id'))
@@ -42,13 +55,20 @@ class Transaction(db.Model):
     timestamp = db.Column(db.DateTime, default=db.func.current_timestamp())
 
 class Order(db.Model):
+    __table_args__ = (
+        db.Index('ix_order_user_id_timestamp_id', 'user_id', 'timestamp', 'id'),
+        db.UniqueConstraint('user_id', 'idempotency_key', name='uq_order_user_id_idempotency_key'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     stock_id = db.Column(db.Integer, db.ForeignKey('stock.id'))
     order_type = db.Column(db.String(10))
+    order_kind = db.Column(db.String(10), nullable=False, default='market', server_default='market')  # 'market' or 'limit'
     amount = db.Column(db.Integer)
+    filled_amount = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     price = db.Column(db.Float)
     status = db.Column(db.String(10), default='pending')
+    idempotency_key = db.Column(db.String(64))
     timestamp = db.Column(db.DateTime, default=db.func.current_timestamp())
 
 class MarketHours(db.Model):
@@ -62,3 +82,28 @@ class MarketSchedule(db.Model):
     date = db.Column(db.Date, unique=True)
     description = db.Column(db.String(200))
     is_closed = db.Column(db.Boolean, default=False)
+
+class Holding(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    stock_id = db.Column(db.Integer, db.ForeignKey('stock.id'), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    reserved = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Shares held by pending sell orders
+    cost_basis = db.Column(db.Float, nullable=False, default=0.0)
+    stock = db.relationship('Stock', lazy='joined')
+
+class SchedulerLock(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    owner = db.Column(db.String(100))
+    expires_at = db.Column(db.DateTime)
+
+class JobRun(db.Model):
+    __table_args__ = (db.Index('ix_job_run_job_name_started_at', 'job_name', 'started_at'),)
+    id = db.Column(db.Integer, primary_key=True)
+    job_name = db.Column(db.String(50), nullable=False)
+    owner = db.Column(db.String(100))
+    scheduled_at = db.Column(db.DateTime)
+    started_at = db.Column(db.DateTime)
+    duration_ms = db.Column(db.Float)
+    lag_ms = db.Column(db.Float)
+    status = db.Column(db.String(10))  # 'success', 'skipped' or 'error'
+    error = db.Column(db.String(500))
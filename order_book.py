@@ -0,0 +1,121 @@
+import heapq
+from collections import deque, namedtuple
+
+# Price-time priority limit order book for one stock. Each side keeps a heap
+# of price levels and a FIFO deque of orders per level, so adding an order is
+# O(log levels) and cancelling is O(1): a cancelled order is only flagged and
+# is dropped when it reaches the front of its level. Matching fills at the
+# resting order's price.
+#
+# An order never trades with a resting order from the same user: it matches
+# past them, and they keep their place in the book.
+
+Fill = namedtuple('Fill', 'buy_order_id sell_order_id buy_user_id sell_user_id price amount')
+
+class BookOrder:
+    __slots__ = ('order_id', 'user_id', 'side', 'price', 'remaining', 'active')
+
+    def __init__(self, order_id, user_id, side, price, remaining):
+        self.order_id = order_id
+        self.user_id = user_id
+        self.side = side
+        self.price = price
+        self.remaining = remaining
+        self.active = True
+
+class OrderBook:
+    def __init__(self):
+        self._bids = []  # heap of -price
+        self._asks = []  # heap of price
+        self._levels = {'buy': {}, 'sell': {}}
+        self._orders = {}
+
+    def __len__(self):
+        return len(self._orders)
+
+    def _best_level(self, side):
+        heap = self._bids if side == 'buy' else self._asks
+        levels = self._levels[side]
+        while heap:
+            price = -heap[0] if side == 'buy' else heap[0]
+            level = levels.get(price)
+            while level and not level[0].active:
+                level.popleft()
+            if level:
+                return price, level
+            # Empty level: drop it so it is never scanned again
+            heapq.heappop(heap)
+            levels.pop(price, None)
+        return None, None
+
+    def best_bid(self):
+        return self._best_level('buy')[0]
+
+    def best_ask(self):
+        return self._best_level('sell')[0]
+
+    def add(self, order_id, user_id, side, price, amount):
+        # Matches the incoming order against the opposite side, rests any
+        # remainder and returns the fills in execution order
+        order = BookOrder(order_id, user_id, side, price, amount)
+        fills = []
+        opposite = 'sell' if side == 'buy' else 'buy'
+        while order.remaining > 0:
+            best_price, level = self._best_level(opposite)
+            if best_price is None or (side == 'buy' and best_price > price) or (side == 'sell' and best_price < price):
+                break
+            if level[0].user_id == user_id:
+                self._match_around_own(order, opposite, fills)
+                break
+            self._fill(order, level[0], best_price, fills)
+        if order.remaining > 0:
+            self._rest(order)
+        return fills
+
+    @staticmethod
+    def _crosses(order, price):
+        return price <= order.price if order.side == 'buy' else price >= order.price
+
+    def _fill(self, order, resting, price, fills):
+        amount_filled = min(order.remaining, resting.remaining)
+        if order.side == 'buy':
+            fills.append(Fill(order.order_id, resting.order_id, order.user_id, resting.user_id, price, amount_filled))
+        else:
+            fills.append(Fill(resting.order_id, order.order_id, resting.user_id, order.user_id, price, amount_filled))
+        order.remaining -= amount_filled
+        resting.remaining -= amount_filled
+        if resting.remaining == 0:
+            # Flagged like a cancel; _best_level drops it from the front of its level
+            resting.active = False
+            del self._orders[resting.order_id]
+
+    def _match_around_own(self, order, opposite, fills):
+        # Slow path once the best level starts with the user's own order: walk
+        # every crossing level in price-time order, skipping their orders
+        prices = sorted((price for price in self._levels[opposite] if self._crosses(order, price)), reverse=opposite == 'buy')
+        for price in prices:
+            for resting in list(self._levels[opposite][price]):
+                if order.remaining == 0:
+                    return
+                if resting.active and resting.user_id != order.user_id:
+                    self._fill(order, resting, price, fills)
+
+    def _rest(self, order):
+        levels = self._levels[order.side]
+        level = levels.get(order.price)
+        if level is None:
+            level = levels[order.price] = deque()
+            heapq.heappush(self._bids if order.side == 'buy' else self._asks, -order.price if order.side == 'buy' else order.price)
+        level.append(order)
+        self._orders[order.order_id] = order
+
+    def cancel(self, order_id):
+        order = self._orders.pop(order_id, None)
+        if order is None:
+            return False
+        order.active = False
+        return True
+
+    def remaining(self, order_id):
+        order = self._orders.get(order_id)
+        return order.remaining if order else 0
@@ -0,0 +1,173 @@
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from models import db, Transaction, StockCandle
+from quote_cache import quote_cache
+
+# Portfolio performance from a user's Transaction history: FIFO realized and
+# unrealized P&L per position, and a daily value curve with time-weighted
+# returns. For FIFO, each stock's shares are laid out on a share axis in the
+# order they were bought; the cost of the first x shares is piecewise linear
+# in x, so the cost of every sell is the difference of two np.interp lookups
+# rather than a walk through lots. Daily positions are a cumulative sum over a
+# (day, stock) matrix valued against the 1d candle closes.
+#
+# The history-dependent part is cached per user. Settlement and matching call
+# invalidate() for the users they touched; the cache key also carries the
+# user's last transaction id and the date, so a settlement in another process
+# is picked up too. Today's value and unrealized P&L always use live quotes.
+# numpy is imported on first computation, so the web and job processes that
+# only import performance_cache to invalidate it do not load it at startup.
+
+def fifo_lots(sides, amounts, prices):
+    # sides are +1 (buy) / -1 (sell), in execution order; returns (quantity, open_cost, realized)
+    import numpy as np
+    buys, sells = sides > 0, sides < 0
+    bought = np.concatenate(([0], np.cumsum(amounts[buys])))
+    cost = np.concatenate(([0.0], np.cumsum(amounts[buys] * prices[buys])))
+    sold_end = np.cumsum(amounts[sells])
+    sold_start = sold_end - amounts[sells]
+    # np.interp holds the last value past the end, so sells beyond what was bought cost nothing
+    sell_cost = np.interp(sold_end, bought, cost) - np.interp(sold_start, bought, cost)
+    realized = float(np.sum(amounts[sells] * prices[sells] - sell_cost))
+    total_sold = sold_end[-1] if len(sold_end) else 0
+    open_cost = float(cost[-1] - np.interp(total_sold, bought, cost))
+    return int(bought[-1] - total_sold), open_cost, realized
+
+def _transactions(user_id):
+    import numpy as np
+    rows = db.session.query(
+        Transaction.stock_id, Transaction.transaction_type, Transaction.amount, Transaction.price, Transaction.timestamp
+    ).filter(
+        Transaction.user_id == user_id, Transaction.amount > 0, Transaction.price.isnot(None)
+    ).order_by(Transaction.timestamp, Transaction.id).all()
+    return (
+        np.array([row.stock_id for row in rows], dtype='int64'),
+        np.array([1 if row.transaction_type == 'buy' else -1 for row in rows], dtype='int64'),
+        np.array([row.amount for row in rows], dtype='int64'),
+        np.array([row.price for row in rows], dtype='float64'),
+        np.array([row.timestamp.date() for row in rows], dtype='datetime64[D]'),
+    )
+
+def _daily_closes(stock_ids, first_day, days):
+    import numpy as np
+    closes = np.full((days, len(stock_ids)), np.nan)
+    column = {stock_id: i for i, stock_id in enumerate(stock_ids)}
+    rows = db.session.query(StockCandle.stock_id, StockCandle.bucket_start, StockCandle.close).filter(
+        StockCandle.resolution == '1d', StockCandle.stock_id.in_(stock_ids),
+        StockCandle.bucket_start >= datetime.combine(first_day.item(), datetime.min.time()),
+    ).all()
+    if rows:
+        day = (np.array([row.bucket_start.date() for row in rows], dtype='datetime64[D]') - first_day).astype('int64')
+        columns = np.array([column[row.stock_id] for row in rows])
+        inside = day < days
+        closes[day[inside], columns[inside]] = np.array([row.close for row in rows])[inside]
+    return closes
+
+def compute(user_id, today=None):
+    import numpy as np
+    today = np.datetime64(today or date.today(), 'D')
+    stock_ids, sides, amounts, prices, days = _transactions(user_id)
+    if not len(stock_ids):
+        return {'positions': {}, 'days': np.array([], dtype='datetime64[D]'), 'values': np.array([]), 'flows': np.array([]), 'holdings': None}
+    unique, stock_index = np.unique(stock_ids, return_inverse=True)
+    positions = {}
+    for i, stock_id in enumerate(unique):
+        mask = stock_index == i
+        quantity, open_cost, realized = fifo_lots(sides[mask], amounts[mask], prices[mask])
+        positions[int(stock_id)] = {'quantity': quantity, 'open_cost': open_cost, 'realized': realized}
+
+    first_day = days[0]
+    n_days = int((max(today, days[-1]) - first_day).astype('int64')) + 1
+    day_index = (days - first_day).astype('int64')
+    signed = sides * amounts
+    holdings = np.zeros((n_days, len(unique)), dtype='int64')
+    np.add.at(holdings, (day_index, stock_index), signed)
+    holdings = np.cumsum(holdings, axis=0)
+    flows = np.bincount(day_index, weights=signed * prices, minlength=n_days)
+
+    # Candle closes first; a day without a candle falls back to that day's fill price, then to the previous day
+    closes = _daily_closes([int(stock_id) for stock_id in unique], first_day, n_days)
+    fill_prices = np.full_like(closes, np.nan)
+    fill_prices[day_index, stock_index] = prices
+    closes = np.where(np.isnan(closes), fill_prices, closes)
+    last_seen = np.maximum.accumulate(np.where(np.isnan(closes), 0, np.arange(n_days)[:, None]), axis=0)
+    closes = np.nan_to_num(closes[last_seen, np.arange(len(unique))])
+    values = np.sum(holdings * closes, axis=1)
+    return {
+        'positions': positions, 'days': first_day + np.arange(n_days), 'values': values, 'flows': flows,
+        'holdings': (unique, holdings[-1]),
+    }
+
+def _live(result):
+    # Revalue today's point and open positions at current quotes
+    import numpy as np
+    values = result['values'].copy()
+    if result['holdings'] is not None:
+        stock_ids, quantities = result['holdings']
+        quotes = [quote_cache.get(int(stock_id)) for stock_id in stock_ids]
+        live = np.array([quote['current_price'] if quote else np.nan for quote in quotes])
+        values[-1] = np.nansum(quantities * live)
+    flows = result['flows']
+    previous = values[:-1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns = np.where(previous > 0, (values[1:] - flows[1:]) / previous - 1, 0.0)
+    positions = {}
+    for stock_id, position in result['positions'].items():
+        quote = quote_cache.get(stock_id)
+        price = quote['current_price'] if quote else None
+        value = price * position['quantity'] if price is not None else None
+        positions[stock_id] = dict(
+            position, ticker=quote['ticker'] if quote else None, price=price,
+            open_cost=round(position['open_cost'], 2), realized=round(position['realized'], 2),
+            market_value=round(value, 2) if value is not None else None,
+            unrealized=round(value - position['open_cost'], 2) if value is not None else None,
+        )
+    return {
+        'positions': positions,
+        'realized': round(sum(position['realized'] for position in positions.values()), 2),
+        'unrealized': round(sum(position['unrealized'] or 0.0 for position in positions.values()), 2),
+        'curve': [
+            {'date': str(day), 'value': round(float(value), 2), 'flow': round(float(flow), 2), 'return': float(ret) if i else 0.0}
+            for i, (day, value, flow, ret) in enumerate(zip(result['days'], values, flows, np.concatenate(([0.0], returns))))
+        ],
+        'time_weighted_return': float(np.prod(1 + returns) - 1) if len(returns) else 0.0,
+    }
+
+class PerformanceCache:
+    def __init__(self, max_users=1000):
+        self.max_users = max_users
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, user_id):
+        last_id = db.session.query(db.func.max(Transaction.id)).filter(Transaction.user_id == user_id).scalar()
+        key = (last_id, date.today())
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == key:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return _live(entry[1])
+        self.misses += 1
+        result = compute(user_id)
+        with self._lock:
+            self._entries[user_id] = (key, result)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return _live(result)
+
+    def invalidate(self, user_ids=None):
+        with self._lock:
+            if user_ids is None:
+                self._entries.clear()
+            for user_id in user_ids or ():
+                self._entries.pop(user_id, None)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+performance_cache = PerformanceCache()
@@ -0,0 +1,138 @@
+import json
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# In-process pub/sub for price changes. The tick job and admin price edits
+# publish quotes; each streaming client holds a Subscription whose buffer keeps
+# only the latest quote per ticker, so a slow client skips intermediate ticks
+# instead of queueing them. Processes without an in-process scheduler learn
+# about ticks through QuotePoller instead.
+
+class Subscription:
+    def __init__(self, bus, tickers=None):
+        self.bus = bus
+        self.tickers = set(tickers) if tickers else None
+        self._pending = {}
+        self._cond = threading.Condition()
+        self.closed = False
+
+    def wants(self, ticker):
+        return self.tickers is None or ticker in self.tickers
+
+    def push(self, quote):
+        with self._cond:
+            self._pending[quote['ticker']] = quote
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        # Returns every coalesced quote since the last call, or [] on timeout
+        with self._cond:
+            if not self._pending and not self.closed:
+                self._cond.wait(timeout)
+            quotes, self._pending = list(self._pending.values()), {}
+            return quotes
+
+    def close(self):
+        self.bus.unsubscribe(self)
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+class PriceBus:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self.published = 0
+
+    def subscribe(self, tickers=None):
+        subscription = Subscription(self, tickers)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, quotes):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for quote in quotes:
+            for subscription in subscribers:
+                if subscription.wants(quote['ticker']):
+                    subscription.push(quote)
+        self.published += len(quotes)
+
+price_bus = PriceBus()
+
+class QuotePoller:
+    # For processes that don't run the tick job themselves: one thread per
+    # process reads current quotes every `interval` seconds while anyone is
+    # subscribed and republishes the ones that changed on the local bus. Web
+    # workers running a scheduler only tick while they are the leader, so the
+    # poller sits out just those stretches.
+
+    def __init__(self, bus, interval=5):
+        self.bus = bus
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last = {}
+
+    def ensure_started(self, app):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(app,), name='quote-poller', daemon=True)
+                self._thread.start()
+
+    def _run(self, app):
+        from models import db, Stock
+        from quote_cache import quote_cache
+        while True:
+            time.sleep(self.interval)
+            if not self.bus.subscriber_count():
+                continue
+            lock = app.extensions.get('scheduler_lock')
+            if lock is not None and lock.is_leader():
+                continue
+            try:
+                with app.app_context():
+                    rows = db.session.query(Stock.ticker, Stock.current_price, Stock.high_price, Stock.low_price).all()
+                changed = []
+                for row in rows:
+                    quote = {'ticker': row.ticker, 'price': row.current_price, 'high': row.high_price, 'low': row.low_price}
+                    if self._last.get(row.ticker) != quote:
+                        if row.ticker in self._last:
+                            changed.append(quote)
+                        self._last[row.ticker] = quote
+                if changed:
+                    quote_cache.invalidate()
+                    self.bus.publish(changed)
+            except Exception as e:
+                logger.error(f"Quote polling failed: {e}")
+
+quote_poller = QuotePoller(price_bus)
+
+def format_event(quotes, event='quotes'):
+    return f"event: {event}\ndata: {json.dumps(quotes)}\n\n"
+
+def stream_events(subscription, snapshot, heartbeat):
+    # Generator for a text/event-stream response; the comment line on timeout
+    # keeps proxies from closing an idle connection.
+    try:
+        if snapshot:
+            yield format_event(snapshot, event='snapshot')
+        while not subscription.closed:
+            quotes = subscription.get(timeout=heartbeat)
+            if quotes:
+                yield format_event(quotes)
+            else:
+                yield ": keepalive\n\n"
+    finally:
+        subscription.close()
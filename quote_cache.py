@@ -0,0 +1,86 @@
+import hashlib
+import threading
+import time
+from collections import namedtuple
+from models import db, Stock
+from db_routing import primary
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Snapshot of every listing's quote, shared by all requests in the process.
+# Prices only move on the price tick or an admin edit, both of which call
+# invalidate(); the TTL bounds staleness for changes made by other processes.
+# version() is a digest of the snapshot, so it changes exactly when a tick or
+# edit changes a quote and agrees across processes holding the same data.
+# row_version() is the same for a single listing, for caching its fragments.
+
+# Everything one load produced, swapped in as a unit so a reader never sees a
+# tick's invalidation between two lookups
+Snapshot = namedtuple('Snapshot', 'quotes by_ticker version row_versions loaded_at')
+
+class QuoteCache:
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._data = None
+
+    def _fresh(self, data):
+        return data is not None and time.monotonic() - data.loaded_at < self.ttl
+
+    def _load(self):
+        # Always from the primary: a lagging replica would pin stale prices for a whole TTL
+        with primary():
+            rows = db.session.query(
+                Stock.id, Stock.company_name, Stock.ticker, Stock.current_price,
+                Stock.high_price, Stock.low_price, Stock.volume
+            ).order_by(Stock.id).all()
+        quotes = {row.id: dict(row._mapping) for row in rows}
+        return Snapshot(
+            quotes=quotes,
+            by_ticker={quote['ticker']: quote for quote in quotes.values()},
+            version=hashlib.blake2b(repr([tuple(row) for row in rows]).encode(), digest_size=8).hexdigest(),
+            row_versions={row.id: tuple(row) for row in rows},
+            loaded_at=time.monotonic(),
+        )
+
+    def _snapshot(self):
+        data = self._data
+        if self._fresh(data):
+            self.hits += 1
+            return data
+        with self._lock:
+            data = self._data
+            if self._fresh(data):
+                self.hits += 1
+                return data
+            self.misses += 1
+            data = self._data = self._load()
+            return data
+
+    def all(self):
+        return list(self._snapshot().quotes.values())
+
+    def get(self, stock_id):
+        return self._snapshot().quotes.get(stock_id)
+
+    def get_by_ticker(self, ticker):
+        return self._snapshot().by_ticker.get(ticker)
+
+    def version(self):
+        return self._snapshot().version
+
+    def row_version(self, stock_id):
+        return self._snapshot().row_versions.get(stock_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._data = None
+
+    def stats(self):
+        data = self._data
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(data.quotes) if data else 0}
+
+quote_cache = QuoteCache()
@@ -0,0 +1,22 @@
+import argparse
+import sys
+from datetime import datetime
+from app import create_app
+from candles import rebuild_candles
+
+app = create_app(web=False)
+
+# Usage: python rebuild_candles.py [stock_id] [--since DATE] [--force]
+parser = argparse.ArgumentParser(description='Recompute candles from stock_price_history.')
+parser.add_argument('stock_id', type=int, nargs='?')
+parser.add_argument('--since', type=datetime.fromisoformat, help='only rebuild days from this date on')
+parser.add_argument('--force', action='store_true', help='rebuild over compacted history, accepting coarser candles')
+args = parser.parse_args()
+
+with app.app_context():
+    try:
+        count = rebuild_candles(stock_id=args.stock_id, since=args.since, force=args.force)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    print(f"Candles rebuilt: {count}.")
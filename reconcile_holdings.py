@@ -0,0 +1,16 @@
+import sys
+from app import create_app
+from holdings import reconcile_holdings
+
+app = create_app(web=False)
+
+# Usage: python reconcile_holdings.py [--check] [user_id]
+with app.app_context():
+    args = sys.argv[1:]
+    fix = '--check' not in args
+    args = [arg for arg in args if arg != '--check']
+    user_id = int(args[0]) if args else None
+    mismatches = reconcile_holdings(user_id=user_id, fix=fix)
+    for mismatch in mismatches:
+        print(f"user {mismatch['user_id']} stock {mismatch['stock_id']}: expected {mismatch['expected']}, found {mismatch['actual']}")
+    print(f"Holdings {'rebuilt' if fix else 'checked'}: {len(mismatches)} mismatches.")
@@ -0,0 +1,382 @@
+import csv
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import groupby
+import numpy as np
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.engine import make_url
+from models import db, User, Stock, StockHistory, Holding, Order, Transaction
+import ledger
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Accelerated replay for backtests and capacity runs. Recorded
+# stock_price_history ticks (or ticks from the price generator) and a
+# scripted order stream are fed through ledger.place_order,
+# settle_pending_orders and the matching engine on a simulated clock. The
+# settlement and matching jobs run every settle_interval / match_interval
+# virtual seconds, as the scheduler would, and the orders and transactions
+# they create are stamped with virtual time.
+#
+# Tickers are split round-robin into one partition per process. Each
+# partition replays into its own sandbox database (a SQLite file by default),
+# created fresh from the source's listings; the source is only read. Each
+# user's starting cash is split evenly between the partitions and cannot move
+# between them, so use one process when a strategy needs all of it in one
+# place. Sandbox SQLite files are written without fsync since they are
+# thrown away.
+#
+# Scripted orders are a CSV with the columns at, user, ticker, side, amount
+# and optionally limit_price. at is an ISO 8601 time, or seconds after the
+# replay start. Orders still pending at the end are cancelled, so the final
+# portfolios hold only cash and shares.
+
+class SimClock:
+    # Virtual time that only moves forward. speed is virtual seconds per wall
+    # second; 0 runs as fast as the work allows.
+    def __init__(self, start, speed=0):
+        self.start = start
+        self.speed = speed
+        self._now = start
+        self._wall_start = time.perf_counter()
+
+    def now(self):
+        return self._now
+
+    def advance_to(self, at):
+        if at > self._now:
+            self._now = at
+        if self.speed:
+            delay = (self._now - self.start).total_seconds() / self.speed - (time.perf_counter() - self._wall_start)
+            if delay > 0:
+                time.sleep(delay)
+
+def read_orders(path):
+    # Returns (orders, [(line, message)] for rows that were skipped). at is a datetime, or a
+    # timedelta from the replay start that replay() resolves.
+    orders, errors = [], []
+    with open(path, newline='', encoding='utf-8-sig') as stream:
+        for line, row in enumerate(csv.DictReader(stream), start=2):
+            try:
+                at = row['at'].strip()
+                try:
+                    at = timedelta(seconds=float(at))
+                except ValueError:
+                    at = datetime.fromisoformat(at)
+                side = row['side'].strip().lower()
+                if side not in ('buy', 'sell'):
+                    raise ValueError(f"side must be buy or sell, not {side!r}")
+                orders.append({
+                    'at': at, 'user': row['user'].strip(), 'ticker': row['ticker'].strip().upper(), 'side': side,
+                    'amount': int(row['amount']),
+                    'limit_price': float(row['limit_price']) if (row.get('limit_price') or '').strip() else None,
+                })
+            except (KeyError, AttributeError, ValueError) as e:
+                errors.append((line, f"{type(e).__name__}: {e}"))
+    return orders, errors
+
+def _recorded_ticks(source, stock_ids, start, end):
+    # Yields (timestamp, {stock_id: price}) in time order without loading the whole range
+    table = StockHistory.__table__
+    query = select(table.c.stock_id, table.c.price, table.c.timestamp).where(
+        table.c.stock_id.in_(stock_ids), table.c.price.isnot(None), table.c.timestamp >= start,
+    )
+    if end is not None:
+        query = query.where(table.c.timestamp < end)
+    with source.connect() as connection:
+        rows = connection.execution_options(stream_results=True).execute(query.order_by(table.c.timestamp, table.c.id))
+        for timestamp, group in groupby(rows, key=lambda row: row.timestamp):
+            yield timestamp, {row.stock_id: row.price for row in group}
+
+def _opening_prices(source, stock_ids, start):
+    # Each stock's first recorded price at or after start
+    table = StockHistory.__table__
+    first = select(table.c.stock_id, func.min(table.c.timestamp).label('timestamp')).where(
+        table.c.stock_id.in_(stock_ids), table.c.price.isnot(None), table.c.timestamp >= start,
+    ).group_by(table.c.stock_id).subquery()
+    query = select(table.c.stock_id, table.c.price).join(
+        first, (table.c.stock_id == first.c.stock_id) & (table.c.timestamp == first.c.timestamp)
+    )
+    with source.connect() as connection:
+        return {row.stock_id: row.price for row in connection.execute(query)}
+
+def _stamp(model, after_id, at):
+    # Give rows created since after_id the virtual time; returns the new high-water id
+    model.query.filter(model.id > after_id).update({'timestamp': at}, synchronize_session=False)
+    db.session.commit()
+    return db.session.query(func.max(model.id)).scalar() or after_id
+
+def _seed_sandbox(source, job, start):
+    table = Stock.__table__
+    with source.connect() as connection:
+        stocks = connection.execute(select(table).where(table.c.id.in_(job['stock_ids'])).order_by(table.c.id)).all()
+    opening = _opening_prices(source, job['stock_ids'], start) if job['generate'] is None else {}
+    db.drop_all()
+    db.create_all()
+    prices = {stock.id: opening.get(stock.id, stock.current_price) for stock in stocks}
+    db.session.bulk_insert_mappings(Stock, [
+        {'id': stock.id, 'ticker': stock.ticker, 'company_name': stock.company_name, 'volume': stock.volume,
+         'initial_price': stock.initial_price, 'current_price': prices[stock.id]}
+        for stock in stocks
+    ])
+    db.session.bulk_insert_mappings(User, [
+        {'id': user_id, 'username': username, 'cash_account': job['cash']}
+        for user_id, username in enumerate(job['users'], start=1)
+    ])
+    if job['shares']:
+        db.session.bulk_insert_mappings(Holding, [
+            {'user_id': user_id, 'stock_id': stock_id, 'quantity': job['shares'], 'reserved': 0,
+             'cost_basis': job['shares'] * price}
+            for user_id in range(1, len(job['users']) + 1) for stock_id, price in prices.items()
+        ])
+    db.session.commit()
+    return {stock.ticker: stock.id for stock in stocks}
+
+def _same_database(a, b):
+    a, b = make_url(a), make_url(b)
+    if a.get_backend_name() == 'sqlite' and b.get_backend_name() == 'sqlite':
+        return bool(a.database) and bool(b.database) and os.path.abspath(a.database) == os.path.abspath(b.database)
+    return (a.get_backend_name(), a.host, a.port, a.database) == (b.get_backend_name(), b.host, b.port, b.database)
+
+def _check_sandboxes(urls, protected):
+    # Every partition drops and recreates its sandbox, so it must be its own
+    # database and never the source or the app's configured database
+    for index, url in enumerate(urls):
+        for other in urls[:index]:
+            if _same_database(url, other):
+                raise ValueError('Partitions would share a sandbox database; put {partition} in the sandbox URL.')
+        for name, protected_url in protected.items():
+            if protected_url and _same_database(url, protected_url):
+                raise ValueError(f"The sandbox database is the {name} database; replay would drop its tables.")
+
+def _unsynced(connection, _):
+    connection.execute('PRAGMA synchronous=OFF')
+    connection.execute('PRAGMA journal_mode=MEMORY')
+
+def run_partition(job):
+    # Runs in a worker process: replays one partition into its sandbox and returns its report
+    from app import create_app
+    from config import Config
+    from stock_price_generator import apply_prices, update_stock_prices_batch
+    from settlement import settle_pending_orders
+    from matching import matching_engine
+
+    logging.getLogger().setLevel(job['log_level'])
+
+    class ReplayConfig(Config):
+        SQLALCHEMY_DATABASE_URI = job['sandbox_url']
+        SQLALCHEMY_BINDS = {}
+        if job['sandbox_url'].startswith('sqlite'):
+            SQLALCHEMY_ENGINE_OPTIONS = {}
+
+    app = create_app(ReplayConfig, web=False)
+    started = time.perf_counter()
+    source = create_engine(job['source_url'])
+    start, end = job['start'], job['end']
+    stats = {'ticks': 0, 'tick_times': 0, 'orders': 0, 'rejected': 0, 'settled': 0, 'fills': 0, 'expired': 0}
+
+    with app.app_context():
+        if job['sandbox_url'].startswith('sqlite'):
+            event.listen(db.engine, 'connect', _unsynced)
+        ids = _seed_sandbox(source, job, start)
+        user_ids = {username: user_id for user_id, username in enumerate(job['users'], start=1)}
+        clock = SimClock(start, job['speed'])
+        orders = deque(job['orders'])
+        rng = random.Random(job['seed'])
+        marks = {'order': 0, 'matched': 0, 'transaction': 0}
+        next_settle = start + timedelta(seconds=job['settle_interval'])
+        next_match = start + timedelta(seconds=job['match_interval'])
+
+        def place(spec):
+            stock = Stock.query.get(ids[spec['ticker']])
+            try:
+                ledger.place_order(user_ids[spec['user']], stock, spec['side'], spec['amount'], limit_price=spec['limit_price'])
+                stats['orders'] += 1
+            except ledger.OrderError:
+                stats['rejected'] += 1
+
+        def run_jobs(settle=True, match=True):
+            done = 0
+            if settle:
+                done += settle_pending_orders()['orders']
+                stats['settled'] += done
+            # Limit orders only cross when a new one arrives, so a sync with nothing new is skipped
+            if match and marks['order'] != marks['matched']:
+                marks['matched'] = marks['order']
+                fills = len(matching_engine.sync())
+                stats['fills'] += fills
+                done += fills
+            if done:
+                marks['transaction'] = _stamp(Transaction, marks['transaction'], clock.now())
+
+        def run_until(at):
+            # Places scripted orders and runs the jobs that fall due up to at, in time order
+            nonlocal next_settle, next_match
+            while True:
+                due = min(orders[0]['at'] if orders else next_settle, next_settle, next_match)
+                if due > at:
+                    return
+                clock.advance_to(due)
+                if orders and orders[0]['at'] <= due:
+                    while orders and orders[0]['at'] <= due:
+                        place(orders.popleft())
+                    marks['order'] = _stamp(Order, marks['order'], due)
+                    continue
+                run_jobs(settle=next_settle <= due, match=next_match <= due)
+                if next_settle <= due:
+                    next_settle += timedelta(seconds=job['settle_interval'])
+                if next_match <= due:
+                    next_match += timedelta(seconds=job['match_interval'])
+
+        if job['generate'] is None:
+            ticks = _recorded_ticks(source, job['stock_ids'], start, end)
+        else:
+            ticks = ((start + timedelta(seconds=job['interval'] * i), None) for i in range(job['generate']))
+        np_rng = np.random.default_rng(job['seed'])
+        tickers = sorted(ids)
+        for timestamp, prices in ticks:
+            run_until(timestamp)
+            clock.advance_to(timestamp)
+            if prices is None:
+                stats['ticks'] += len(update_stock_prices_batch(np_rng, timestamp))
+            else:
+                rows = db.session.query(Stock.id, Stock.ticker, Stock.current_price, Stock.high_price, Stock.low_price) \
+                    .filter(Stock.id.in_(list(prices))).order_by(Stock.id).all()
+                stats['ticks'] += len(apply_prices(rows, np.array([prices[row.id] for row in rows]), timestamp))
+            db.session.commit()
+            stats['tick_times'] += 1
+            if job['orders_per_tick']:
+                for _ in range(job['orders_per_tick']):
+                    stock = Stock.query.get(ids[rng.choice(tickers)])
+                    limit = rng.random() < 0.2
+                    side = 'buy' if rng.random() < 0.6 else 'sell'
+                    place({
+                        'user': rng.choice(job['users']), 'ticker': stock.ticker, 'side': side, 'amount': rng.randrange(1, 20),
+                        'limit_price': round(stock.current_price * (0.98 if side == 'buy' else 1.02), 2) if limit else None,
+                    })
+                marks['order'] = _stamp(Order, marks['order'], timestamp)
+
+        run_until(max(clock.now(), orders[-1]['at']) if orders else clock.now())
+        run_jobs()
+        for order in Order.query.filter_by(status='pending').all():
+            if ledger.cancel_order(order):
+                stats['expired'] += 1
+
+        prices = dict(db.session.query(Stock.id, Stock.current_price))
+        cash = {user.username: str(user.cash_account) for user in User.query}
+        positions = {}
+        usernames = {user_id: username for username, user_id in user_ids.items()}
+        for holding in Holding.query.filter(Holding.quantity > 0):
+            positions.setdefault(usernames[holding.user_id], {})[holding.stock.ticker] = {
+                'quantity': holding.quantity, 'cost_basis': holding.cost_basis, 'price': prices[holding.stock_id],
+            }
+        stats['transactions'] = db.session.query(func.count(Transaction.id)).scalar()
+    source.dispose()
+    return dict(
+        stats, partition=job['partition'], tickers=tickers, start=start, end=clock.now(),
+        elapsed=time.perf_counter() - started, cash=cash, positions=positions,
+    )
+
+def replay(source_url, tickers=None, start=None, end=None, orders=(), generate=None, interval=60, orders_per_tick=0,
+           users=None, cash=100000, shares=0, processes=None, settle_interval=60, match_interval=5, speed=0,
+           sandbox_url=None, seed=1, log_level=logging.WARNING):
+    # generate=None replays recorded history; an int generates that many ticks interval seconds apart.
+    # sandbox_url may contain {partition}; by default each partition gets a SQLite file in a temporary directory.
+    source = create_engine(source_url)
+    table = Stock.__table__
+    with source.connect() as connection:
+        query = select(table.c.id, table.c.ticker).order_by(table.c.id)
+        if tickers:
+            query = query.where(table.c.ticker.in_(tickers))
+        listings = connection.execute(query).all()
+        if not listings:
+            raise ValueError('No matching stocks in the source database.')
+        if start is None and generate is None:
+            history = StockHistory.__table__
+            start = connection.execute(select(func.min(history.c.timestamp)).where(
+                history.c.stock_id.in_([stock.id for stock in listings]))).scalar()
+            if start is None:
+                raise ValueError('No recorded history for these stocks; generate ticks instead.')
+    source.dispose()
+    start = start or datetime.now().replace(second=0, microsecond=0)
+
+    orders = sorted(
+        (dict(order, at=start + order['at']) if isinstance(order['at'], timedelta) else order for order in orders),
+        key=lambda order: order['at'],
+    )
+    known = {stock.ticker for stock in listings}
+    unknown = [order for order in orders if order['ticker'] not in known]
+    scripted = sorted({order['user'] for order in orders})
+    users = list(users) if users else scripted or [f'trader{i}' for i in range(1, 11)]
+    users += [username for username in scripted if username not in users]
+    processes = max(1, min(processes or os.cpu_count() or 1, len(listings)))
+    partitions = [listings[i::processes] for i in range(processes)]
+    cash = Decimal(cash)
+    cash_split = [ledger.money(cash / processes)] * processes
+    cash_split[0] += cash - sum(cash_split)  # The first partition takes the rounding remainder
+    # Random orders are shared out by ticker count so the total rate does not depend on processes
+    order_split = [orders_per_tick * len(partition) // len(listings) for partition in partitions]
+    for index in range(orders_per_tick - sum(order_split)):
+        order_split[index] += 1
+
+    if sandbox_url:
+        from config import Config
+        _check_sandboxes(
+            [sandbox_url.format(partition=index) for index in range(processes)],
+            {'source': source_url, 'configured': Config.SQLALCHEMY_DATABASE_URI},
+        )
+
+    with tempfile.TemporaryDirectory(prefix='replay-') as scratch:
+        jobs = []
+        for index, partition in enumerate(partitions):
+            tickers_in = {stock.ticker for stock in partition}
+            jobs.append({
+                'partition': index, 'stock_ids': [stock.id for stock in partition], 'source_url': source_url,
+                'sandbox_url': (sandbox_url or 'sqlite:///' + os.path.join(scratch, 'partition{partition}.db')).format(partition=index),
+                'start': start, 'end': end, 'generate': generate, 'interval': interval,
+                'orders': [order for order in orders if order['ticker'] in tickers_in], 'orders_per_tick': order_split[index],
+                'users': users, 'cash': cash_split[index], 'shares': shares, 'settle_interval': settle_interval,
+                'match_interval': match_interval, 'speed': speed, 'seed': seed + index, 'log_level': log_level,
+            })
+        started = time.perf_counter()
+        if processes == 1:
+            results = [run_partition(jobs[0])]
+        else:
+            with multiprocessing.get_context('spawn').Pool(processes) as pool:
+                results = pool.map(run_partition, jobs)
+        elapsed = time.perf_counter() - started
+    return merge(results, users, elapsed, len(unknown))
+
+def merge(results, users, elapsed, unknown_orders=0):
+    totals = {key: sum(result[key] for result in results) for key in
+              ('ticks', 'tick_times', 'orders', 'rejected', 'settled', 'fills', 'expired', 'transactions')}
+    start = min(result['start'] for result in results)
+    end = max(result['end'] for result in results)
+    virtual = (end - start).total_seconds()
+    portfolios = {}
+    for username in users:
+        balance = sum(Decimal(result['cash'][username]) for result in results)
+        positions = {}
+        for result in results:
+            positions.update(result['positions'].get(username, {}))
+        value = sum(position['quantity'] * position['price'] for position in positions.values())
+        portfolios[username] = {
+            'cash': balance, 'market_value': round(value, 2), 'total': balance + Decimal(str(round(value, 2))),
+            'positions': positions,
+        }
+    return dict(
+        totals, unknown_orders=unknown_orders, processes=len(results), start=start, end=end,
+        virtual_seconds=virtual, elapsed=elapsed,
+        ticks_per_sec=totals['ticks'] / elapsed if elapsed else 0.0,
+        orders_per_sec=totals['orders'] / elapsed if elapsed else 0.0,
+        speedup=virtual / elapsed if elapsed else 0.0,
+        partitions=[{key: value for key, value in result.items() if key not in ('cash', 'positions')} for result in results],
+        portfolios=portfolios,
+    )
@@ -0,0 +1,127 @@
+import time
+from datetime import datetime, timedelta
+from models import db, Stock, StockHistory, StockCandle
+from candles import RESOLUTIONS, bucket_start
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Retention for stock_price_history. Every tick is kept for raw_days; after
+# that each hour keeps only its first, last, highest and lowest tick, and
+# after hourly_days each day does the same. The kept rows are real ticks, so
+# history pages and exports read compacted ranges unchanged, and the candle
+# tables still hold the exact OHLC for every period.
+#
+# Each stage scans one stock at a time and deletes in batches of batch_size
+# ids, one transaction per batch, so no lock is held for long. Scheduled runs
+# only look back lookback_days past each cutoff; pass full=True to sweep all
+# history, e.g. the first time or after the job has been off for a while.
+# Running again over an already compacted range deletes nothing.
+#
+# Candles get their own retention: 1m candles are dropped after minute_days
+# and 1h candles after hourly_candle_days (0 keeps them); 1d candles are kept.
+# Pages over windows older than that read the next coarser resolution (see
+# candles.pick_resolution). Old candles are deleted per stock in slices of
+# batch_size buckets under the same lookback rules.
+
+STAGES = (('1h', 'raw_days'), ('1d', 'hourly_days'))
+CANDLE_STAGES = (('1m', 'minute_days'), ('1h', 'hourly_candle_days'))
+
+def _redundant_ticks(stock_id, resolution, start, end):
+    # Ids of ticks in [start, end) that are not the first, last, high or low of their bucket
+    query = db.session.query(StockHistory.id, StockHistory.price, StockHistory.timestamp) \
+        .filter(StockHistory.stock_id == stock_id, StockHistory.price.isnot(None), StockHistory.timestamp < end)
+    if start is not None:
+        query = query.filter(StockHistory.timestamp >= start)
+    redundant, scanned = [], 0
+    bucket, ids, keep = None, [], None
+
+    def close():
+        redundant.extend(tick_id for tick_id in ids if tick_id not in keep)
+
+    for row in query.order_by(StockHistory.timestamp, StockHistory.id).yield_per(5000):
+        scanned += 1
+        row_bucket = bucket_start(row.timestamp, resolution)
+        if row_bucket != bucket:
+            if bucket is not None:
+                close()
+            bucket, ids = row_bucket, []
+            first = high = low = row
+        if row.price > high.price:
+            high = row
+        if row.price < low.price:
+            low = row
+        ids.append(row.id)
+        keep = {first.id, row.id, high.id, low.id}  # row is the last tick so far
+    if bucket is not None:
+        close()
+    return redundant, scanned
+
+def _delete(ids, batch_size):
+    for offset in range(0, len(ids), batch_size):
+        batch = ids[offset:offset + batch_size]
+        StockHistory.query.filter(StockHistory.id.in_(batch)).delete(synchronize_session=False)
+        db.session.commit()
+
+def _prune_candles(stock_id, resolution, start, end, batch_size, dry_run):
+    # Deletes the stock's candles in [start, end), batch_size buckets per transaction
+    query = StockCandle.query.filter(StockCandle.stock_id == stock_id, StockCandle.resolution == resolution)
+    if start is None:
+        start = query.with_entities(db.func.min(StockCandle.bucket_start)).scalar()
+        if start is None:
+            return 0
+    deleted = 0
+    step = RESOLUTIONS[resolution] * batch_size
+    while start < end:
+        window = query.filter(StockCandle.bucket_start >= start, StockCandle.bucket_start < min(start + step, end))
+        deleted += window.count() if dry_run else window.delete(synchronize_session=False)
+        db.session.commit()
+        start += step
+    return deleted
+
+def compact_history(raw_days=7, hourly_days=90, batch_size=5000, lookback_days=7, full=False, dry_run=False, now=None,
+                    minute_days=30, hourly_candle_days=365):
+    if hourly_days < raw_days:
+        raise ValueError('hourly_days must not be less than raw_days')
+    if hourly_candle_days and hourly_candle_days < minute_days:
+        raise ValueError('hourly_candle_days must not be less than minute_days')
+    now = now or datetime.now()
+    ages = {'raw_days': raw_days, 'hourly_days': hourly_days}
+    stats = {'scanned': 0, 'deleted': 0, 'stages': {}, 'candles': {}}
+    started = time.perf_counter()
+    stock_ids = [stock_id for stock_id, in db.session.query(Stock.id).order_by(Stock.id)]
+    db.session.commit()  # End the read transaction before the first delete batch
+    ends = [bucket_start(now - timedelta(days=ages[age]), resolution) for resolution, age in STAGES]
+    for index, (resolution, age) in enumerate(STAGES):
+        end = ends[index]
+        start = None if full else end - timedelta(days=lookback_days)
+        if index + 1 < len(ends) and (start is None or start < ends[index + 1]):
+            start = ends[index + 1]  # The next stage compacts further below its own cutoff
+        stage = {'start': start, 'end': end, 'scanned': 0, 'deleted': 0}
+        for stock_id in stock_ids:
+            redundant, scanned = _redundant_ticks(stock_id, resolution, start, end)
+            db.session.commit()
+            if not dry_run:
+                _delete(redundant, batch_size)
+            stage['scanned'] += scanned
+            stage['deleted'] += len(redundant)
+        stats['stages'][resolution] = stage
+        stats['scanned'] += stage['scanned']
+        stats['deleted'] += stage['deleted']
+    candle_ages = {'minute_days': minute_days, 'hourly_candle_days': hourly_candle_days}
+    for resolution, age in CANDLE_STAGES:
+        if not candle_ages[age]:
+            continue
+        end = bucket_start(now - timedelta(days=candle_ages[age]), '1d')
+        start = None if full else end - timedelta(days=lookback_days)
+        stage = {'start': start, 'end': end, 'deleted': 0}
+        for stock_id in stock_ids:
+            stage['deleted'] += _prune_candles(stock_id, resolution, start, end, batch_size, dry_run)
+        stats['candles'][resolution] = stage
+    stats['elapsed'] = time.perf_counter() - started
+    candles_deleted = sum(stage['deleted'] for stage in stats['candles'].values())
+    logger.info(
+        f"History compaction {'would reclaim' if dry_run else 'reclaimed'} {stats['deleted']} of "
+        f"{stats['scanned']} scanned rows and {candles_deleted} candles in {stats['elapsed']:.1f}s"
+    )
+    return stats
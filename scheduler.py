@@ -0,0 +1,121 @@
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from models import db, SchedulerLock, JobRun
+from instrumentation import track
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Background jobs run in whichever process holds the 'scheduler' lease row.
+# Every process with a scheduler tries to take or renew the lease before each
+# run, so with several workers or nodes exactly one of them does the work and
+# a standby takes over once a dead leader's lease expires. Each run the leader
+# performs is recorded in JobRun with its duration, lag behind its scheduled
+# time and outcome.
+
+class LeaderLock:
+    def __init__(self, name='scheduler', lease_seconds=90):
+        self.name = name
+        self.lease = timedelta(seconds=lease_seconds)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.held_until = None
+
+    def acquire(self):
+        now = datetime.utcnow()
+        table = SchedulerLock.__table__
+        result = db.session.execute(
+            table.update()
+            .where(table.c.name == self.name)
+            .where(db.or_(table.c.owner == self.owner, table.c.expires_at < now))
+            .values(owner=self.owner, expires_at=now + self.lease)
+        )
+        if result.rowcount == 1:
+            db.session.commit()
+            self.held_until = now + self.lease
+            return True
+        if SchedulerLock.query.get(self.name) is not None:
+            db.session.rollback()
+            self.held_until = None
+            return False
+        try:
+            db.session.add(SchedulerLock(name=self.name, owner=self.owner, expires_at=now + self.lease))
+            db.session.commit()
+            self.held_until = now + self.lease
+            return True
+        except IntegrityError:
+            # Another process created the row first
+            db.session.rollback()
+            self.held_until = None
+            return False
+
+    def is_leader(self):
+        # Whether this process held the lease at its last acquire and it has not run out since
+        return self.held_until is not None and self.held_until > datetime.utcnow()
+
+    def release(self):
+        table = SchedulerLock.__table__
+        db.session.execute(table.update().where(table.c.name == self.name).where(table.c.owner == self.owner).values(expires_at=datetime.utcnow()))
+        db.session.commit()
+        self.held_until = None
+
+def run_job(app, lock, name, func, anchor, interval):
+    # Returns silently when another process is the leader. A job returns
+    # 'skipped' when it decided not to run (e.g. the market is closed).
+    with app.app_context():
+        if not lock.acquire():
+            return
+        started_at = datetime.utcnow()
+        scheduled_at = anchor + interval * ((started_at - anchor) // interval)
+        started = time.perf_counter()
+        status, error = 'success', None
+        try:
+            with track(f"job:{name}"):
+                outcome = func()
+            if outcome == 'skipped':
+                status = 'skipped'
+        except Exception as e:
+            logger.exception(f"Job {name} failed")
+            db.session.rollback()
+            status, error = 'error', str(e)[:500]
+        duration_ms = 1000 * (time.perf_counter() - started)
+        db.session.add(JobRun(
+            job_name=name, owner=lock.owner, scheduled_at=scheduled_at, started_at=started_at,
+            duration_ms=duration_ms, lag_ms=(started_at - scheduled_at).total_seconds() * 1000,
+            status=status, error=error,
+        ))
+        db.session.commit()
+        logger.info(f"Job {name} {status} in {duration_ms:.1f} ms")
+
+def start_scheduler(app, jobs, blocking=False):
+    # jobs is a list of (name, func, interval_seconds)
+    if 'scheduler' in app.extensions:
+        return app.extensions['scheduler']
+    if blocking:
+        from apscheduler.schedulers.blocking import BlockingScheduler as Scheduler
+    else:
+        from apscheduler.schedulers.background import BackgroundScheduler as Scheduler
+    lock = LeaderLock(lease_seconds=app.config['SCHEDULER_LEASE_SECONDS'])
+    anchor = datetime.utcnow().replace(second=0, microsecond=0)
+    scheduler = Scheduler()
+    for name, func, seconds in jobs:
+        interval = timedelta(seconds=seconds)
+        scheduler.add_job(
+            run_job, 'interval', seconds=seconds, args=[app, lock, name, func, anchor, interval],
+            id=name, coalesce=True, max_instances=1,
+        )
+    app.extensions['scheduler'] = scheduler
+    app.extensions['scheduler_lock'] = lock
+    logger.info(f"Scheduler starting as {lock.owner} with jobs: {', '.join(name for name, _, _ in jobs)}")
+    scheduler.start()
+    return scheduler
+
+if __name__ == '__main__':
+    # Dedicated scheduler process: python scheduler.py
+    from app import create_app
+    from jobs import scheduled_jobs
+    app = create_app(web=False)
+    start_scheduler(app, scheduled_jobs(app.config), blocking=True)
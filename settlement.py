@@ -0,0 +1,110 @@
+import time
+from collections import defaultdict
+from decimal import Decimal
+from models import db, Transaction, Order
+from holdings import apply_fills
+from ledger import credit_cash_many
+from performance import performance_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+
+# Settles pending market orders in bounded chunks; limit orders are matched by
+# matching.py instead. Each chunk is one DB transaction: the orders are loaded
+# and locked, sellers are credited once per user with the aggregated proceeds
+# (buy cash was already reserved by ledger.place_order), transactions are bulk
+# inserted and the chunk's orders are marked completed together. If a
+# concurrent cancel got to one of the orders first the whole chunk is rolled
+# back and retried at half the size.
+
+MAX_CHUNK_RETRIES = 10
+
+class ChunkConflict(Exception):
+    pass
+
+class SettlementError(Exception):
+    pass
+
+def settle_pending_orders(chunk_size=DEFAULT_CHUNK_SIZE):
+    stats = {'orders': 0, 'chunks': 0, 'failed_chunks': 0, 'elapsed': 0.0, 'chunk_latencies': []}
+    started = time.perf_counter()
+    last_id = 0
+    retries = 0
+    size = chunk_size
+    while True:
+        chunk_started = time.perf_counter()
+        orders = Order.query.filter(
+            Order.status == 'pending', Order.order_kind == 'market', Order.id > last_id
+        ).order_by(Order.id).limit(size).with_for_update().all()
+        if not orders:
+            break
+        # Read before commit expires the orders
+        order_ids = [order.id for order in orders]
+        user_ids = {order.user_id for order in orders}
+        try:
+            _settle_chunk(orders)
+            db.session.commit()
+        except ChunkConflict as e:
+            db.session.rollback()
+            retries += 1
+            size = max(1, size // 2)
+            if retries <= MAX_CHUNK_RETRIES:
+                logger.warning(f"Retrying settlement chunk after id {last_id}: {e}")
+                continue
+            logger.error(f"Settlement of orders after id {last_id} kept conflicting, giving up")
+            stats['failed_chunks'] += 1
+            break
+        except Exception as e:
+            logger.error(f"Settlement of orders after id {last_id} failed: {e}")
+            db.session.rollback()
+            stats['failed_chunks'] += 1
+            break
+        performance_cache.invalidate(user_ids)
+        retries = 0
+        last_id = order_ids[-1]
+        stats['orders'] += len(orders)
+        stats['chunks'] += 1
+        stats['chunk_latencies'].append(time.perf_counter() - chunk_started)
+        if len(orders) < size:
+            break
+        size = chunk_size
+
+    stats['elapsed'] = time.perf_counter() - started
+    stats['orders_per_sec'] = stats['orders'] / stats['elapsed'] if stats['elapsed'] > 0 else 0.0
+    latencies = stats['chunk_latencies']
+    stats['avg_chunk_ms'] = 1000 * sum(latencies) / len(latencies) if latencies else 0.0
+    stats['max_chunk_ms'] = 1000 * max(latencies) if latencies else 0.0
+    logger.info(
+        f"Settled {stats['orders']} orders in {stats['chunks']} chunks "
+        f"({stats['orders_per_sec']:.0f} orders/sec, avg chunk {stats['avg_chunk_ms']:.1f} ms, "
+        f"max chunk {stats['max_chunk_ms']:.1f} ms)"
+    )
+    return stats
+
+def _settle_chunk(orders):
+    cash_deltas = defaultdict(Decimal)
+    transactions = []
+    fills = []
+    for order in orders:
+        if order.order_type == 'sell':
+            cash_deltas[order.user_id] += Decimal(str(order.price)) * order.amount
+        elif order.order_type != 'buy':
+            continue
+        transactions.append({
+            'user_id': order.user_id, 'stock_id': order.stock_id, 'amount': order.amount,
+            'price': order.price, 'transaction_type': order.order_type,
+        })
+        fills.append((order.user_id, order.stock_id, order.order_type, order.amount, order.price))
+
+    order_ids = [order.id for order in orders]
+    updated = Order.query.filter(Order.id.in_(order_ids), Order.status == 'pending').update(
+        {'status': 'completed'}, synchronize_session=False
+    )
+    if updated != len(order_ids):
+        raise ChunkConflict(f"{len(order_ids) - updated} orders changed status during settlement")
+
+    credit_cash_many(cash_deltas)
+    db.session.bulk_insert_mappings(Transaction, transactions)
+    apply_fills(fills)
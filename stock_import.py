@@ -0,0 +1,175 @@
+import csv
+from datetime import datetime
+from itertools import groupby
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, Stock, StockHistory
+from candles import record_ticks
+from quote_cache import quote_cache
+from price_stream import price_bus
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bulk listing and price import from CSV. The file is read as a stream and
+# applied chunk_size rows at a time: one query loads the chunk's existing
+# stocks, new listings and updates go out as bulk statements together with
+# the StockHistory rows and candle ticks, and the chunk commits once.
+#
+# Columns: ticker (required), company_name, volume, price, timestamp. A row
+# for an unknown ticker creates the listing and needs company_name, volume
+# and price, like the create stock form. A row for a known ticker updates
+# whichever of company_name and volume it has. Every price, including a new
+# listing's opening price, is recorded as a tick at timestamp (ISO 8601,
+# default now). Rows apply in file order, so the last price for a ticker
+# becomes its current price.
+#
+# Invalid rows are skipped and reported as (line, ticker, message) without
+# stopping the import. If a chunk fails to write, every row in it is reported
+# and the import carries on with the next chunk.
+
+COLUMNS = ('ticker', 'company_name', 'volume', 'price', 'timestamp')
+
+def _parse(row, now):
+    ticker = (row.get('ticker') or '').strip().upper()
+    if not ticker:
+        raise ValueError('ticker is required')
+    if len(ticker) > 10:
+        raise ValueError('ticker is longer than 10 characters')
+    parsed = {'ticker': ticker}
+    company_name = (row.get('company_name') or '').strip()
+    if company_name:
+        if len(company_name) > 100:
+            raise ValueError('company_name is longer than 100 characters')
+        parsed['company_name'] = company_name
+    if (row.get('volume') or '').strip():
+        try:
+            parsed['volume'] = int(row['volume'])
+        except ValueError:
+            raise ValueError(f"volume {row['volume']!r} is not an integer")
+        if parsed['volume'] < 0:
+            raise ValueError('volume must not be negative')
+    if (row.get('price') or '').strip():
+        try:
+            parsed['price'] = round(float(row['price']), 2)
+        except ValueError:
+            raise ValueError(f"price {row['price']!r} is not a number")
+        if not parsed['price'] > 0:
+            raise ValueError('price must be positive')
+        try:
+            parsed['timestamp'] = datetime.fromisoformat(row['timestamp'].strip()) if (row.get('timestamp') or '').strip() else now
+        except ValueError:
+            raise ValueError(f"timestamp {row['timestamp']!r} is not ISO 8601")
+    return parsed
+
+def _apply_chunk(rows, report, errors):
+    # rows are (line, parsed) pairs that passed _parse; errors collects rows rejected here
+    tickers = {row['ticker'] for _, row in rows}
+    existing = {
+        row.ticker: {'id': row.id, 'ticker': row.ticker, 'current_price': row.current_price,
+                     'high_price': row.high_price, 'low_price': row.low_price}
+        for row in db.session.query(Stock.id, Stock.ticker, Stock.current_price, Stock.high_price, Stock.low_price)
+        .filter(Stock.ticker.in_(tickers))
+    }
+    created, updated, ticks, applied = {}, {}, [], []
+    for line, row in rows:
+        ticker = row['ticker']
+        if ticker not in existing and ticker not in created:
+            missing = [column for column in ('company_name', 'volume', 'price') if column not in row]
+            if missing:
+                errors.append((line, ticker, f"new listing needs {', '.join(missing)}"))
+                continue
+            created[ticker] = {
+                'ticker': ticker, 'company_name': row['company_name'], 'volume': row['volume'],
+                'initial_price': row['price'], 'current_price': row['price'],
+                'high_price': row['price'], 'low_price': row['price'],
+            }
+            # The opening price is a tick like any other, so charts and candles start with the listing
+            ticks.append((ticker, row['price'], row['timestamp']))
+            applied.append(line)
+            continue
+        stock = existing.get(ticker) or created[ticker]
+        for column in ('company_name', 'volume'):
+            if column in row:
+                stock[column] = row[column]
+        if 'price' in row:
+            price = row['price']
+            stock['current_price'] = price
+            stock['high_price'] = price if stock.get('high_price') is None else max(stock['high_price'], price)
+            stock['low_price'] = price if stock.get('low_price') is None else min(stock['low_price'], price)
+            ticks.append((ticker, price, row['timestamp']))
+        if ticker in existing:
+            updated[ticker] = stock
+        applied.append(line)
+
+    if created:
+        db.session.bulk_insert_mappings(Stock, list(created.values()))
+        ids = dict(db.session.query(Stock.ticker, Stock.id).filter(Stock.ticker.in_(created)))
+    else:
+        ids = {}
+    ids.update({ticker: stock['id'] for ticker, stock in existing.items()})
+    if updated:
+        db.session.bulk_update_mappings(Stock, [
+            {column: value for column, value in stock.items() if column != 'ticker'} for stock in updated.values()
+        ])
+    if ticks:
+        db.session.bulk_insert_mappings(StockHistory, [
+            {'stock_id': ids[ticker], 'price': price, 'timestamp': timestamp} for ticker, price, timestamp in ticks
+        ])
+        # record_ticks takes one timestamp per call; a stable sort keeps file order within each timestamp
+        for timestamp, group in groupby(sorted(ticks, key=lambda tick: tick[2]), key=lambda tick: tick[2]):
+            record_ticks([(ids[ticker], price) for ticker, price, _ in group], timestamp)
+    db.session.commit()
+
+    report['created'] += len(created)
+    report['updated'] += len(updated)
+    report['ticks'] += len(ticks)
+    report['imported'] += len(applied)
+    return [
+        {'ticker': ticker, 'price': stock['current_price'], 'high': stock.get('high_price'), 'low': stock.get('low_price')}
+        for ticker, stock in list(created.items()) + list(updated.items())
+    ]
+
+def import_stocks(stream, chunk_size=1000, now=None):
+    # stream is a text file object; returns the report dict
+    now = now or datetime.now()
+    report = {'rows': 0, 'imported': 0, 'created': 0, 'updated': 0, 'ticks': 0, 'errors': []}
+    reader = csv.DictReader(stream)
+    if reader.fieldnames is None or 'ticker' not in [name.strip() for name in reader.fieldnames]:
+        report['errors'].append((1, None, f"header must include ticker (columns: {', '.join(COLUMNS)})"))
+        return report
+    reader.fieldnames = [name.strip() for name in reader.fieldnames]
+    published = {}
+    chunk = []
+
+    def flush():
+        errors = []
+        try:
+            for update in _apply_chunk(chunk, report, errors):
+                published[update['ticker']] = update
+            report['errors'].extend(errors)
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            logger.error(f"Stock import chunk at line {chunk[0][0]} failed: {e}")
+            report['errors'].extend((line, row['ticker'], 'chunk failed to write') for line, row in chunk)
+        chunk.clear()
+
+    for row in reader:
+        report['rows'] += 1
+        try:
+            chunk.append((reader.line_num, _parse(row, now)))
+        except ValueError as e:
+            report['errors'].append((reader.line_num, (row.get('ticker') or '').strip().upper() or None, str(e)))
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+
+    if report['imported']:
+        quote_cache.invalidate()
+        price_bus.publish(list(published.values()))
+    report['errors'].sort(key=lambda error: error[0])
+    logger.info(
+        f"Stock import: {report['imported']} of {report['rows']} rows, {report['created']} created, "
+        f"{report['updated']} updated, {report['ticks']} ticks, {len(report['errors'])} errors"
+    )
+    return report
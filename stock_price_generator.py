@@ -1,6 +1,11 @@
 import random
 from datetime import datetime
+import numpy as np
+from flask import current_app
 from models import db, Stock, StockHistory
+from candles import record_ticks
+from quote_cache import quote_cache
+from price_stream import price_bus
 import logging
 
 # Configure logging
@@ -19,20 +24,82 @@ def generate_random_price(current_price):
     new_price = current_price * (1 + change_percent)
     return round(new_price, 2)
 
+def generate_random_prices(current_prices, rng):
+    change_percent = rng.uniform(-0.05, 0.05, size=current_prices.shape)  # Same -5%..5% walk as generate_random_price
+    return np.round(current_prices * (1 + change_percent), 2)
+
+_rng = None
+
+def get_rng(seed=None):
+    # One generator per process, seeded on first use, so a seeded run produces the same sequence of ticks
+    global _rng
+    if _rng is None:
+        _rng = np.random.default_rng(seed)
+    return _rng
+
+def update_stock_prices_batch(rng, timestamp):
+    rows = db.session.query(Stock.id, Stock.ticker, Stock.current_price, Stock.high_price, Stock.low_price).order_by(Stock.id).all()
+    if not rows:
+        return []
+    current = np.array([row.current_price for row in rows], dtype=float)
+    return apply_prices(rows, generate_random_prices(current, rng), timestamp)
+
+def apply_prices(rows, new_prices, timestamp):
+    # rows are (id, ticker, current_price, high_price, low_price) as selected above, new_prices
+    # a matching array; also used by replay.py to write recorded ticks
+    ids = np.array([row.id for row in rows])
+    high = np.array([row.high_price if row.high_price is not None else np.nan for row in rows], dtype=float)
+    low = np.array([row.low_price if row.low_price is not None else np.nan for row in rows], dtype=float)
+    # fmax/fmin ignore the NaNs standing in for a missing high/low
+    new_high = np.fmax(high, new_prices)
+    new_low = np.fmin(low, new_prices)
+
+    updates = [
+        {'id': int(stock_id), 'current_price': float(price), 'high_price': float(hi), 'low_price': float(lo)}
+        for stock_id, price, hi, lo in zip(ids, new_prices, new_high, new_low)
+    ]
+    db.session.bulk_update_mappings(Stock, updates)
+    db.session.bulk_insert_mappings(StockHistory, [{'stock_id': row['id'], 'price': row['current_price'], 'timestamp': timestamp} for row in updates])
+    record_ticks([(row['id'], row['current_price']) for row in updates], timestamp)
+    if logger.isEnabledFor(logging.DEBUG):
+        for row, update in zip(rows, updates):
+            logger.debug(f"Updating {row.ticker} from {row.current_price} to {update['current_price']}")
+    return [dict(update, ticker=row.ticker) for row, update in zip(rows, updates)]
+
+def update_stock_prices_loop(timestamp):
+    stocks = Stock.query.all()
+    updates = []
+    for stock in stocks:
+        new_price = generate_random_price(stock.current_price)
+        logger.info(f"Updating {stock.ticker} from {stock.current_price} to {new_price}")
+        stock.current_price = new_price
+        stock.high_price = new_price if stock.high_price is None else max(stock.high_price, new_price)
+        stock.low_price = new_price if stock.low_price is None else min(stock.low_price, new_price)
+        stock_history = StockHistory(stock_id=stock.id, price=new_price, timestamp=timestamp)
+        db.session.add(stock_history)
+        updates.append({'id': stock.id, 'ticker': stock.ticker, 'current_price': new_price, 'high_price': stock.high_price, 'low_price': stock.low_price})
+    record_ticks([(row['id'], row['current_price']) for row in updates], timestamp)
+    return updates
+
 def update_stock_prices():
     logger.info("Updating stock prices...")
-    from app import app  # Import app within the function to avoid circular import
-    with app.app_context():
-        stocks = Stock.query.all()
-        for stock in stocks:
-            new_price = generate_random_price(stock.current_price)
-            logger.info(f"Updating {stock.ticker} from {stock.current_price} to {new_price}")
-            stock.current_price = new_price
-            stock_history = StockHistory(stock_id=stock.id, price=new_price)
-            db.session.add(stock_history)
-        db.session.commit()
-        logger.info(f"Stock prices updated at {datetime.now()}")
+    # Runs in the caller's app context (the scheduler job or `flask tick`)
+    timestamp = datetime.now()  # One timestamp per tick so history rows and candles line up
+    if current_app.config['PRICE_TICK_MODE'] == 'batch':
+        updates = update_stock_prices_batch(get_rng(current_app.config['PRICE_TICK_SEED']), timestamp)
+    else:
+        updates = update_stock_prices_loop(timestamp)
+    db.session.commit()
+    quote_cache.invalidate()
+    price_bus.publish([
+        {'ticker': update['ticker'], 'price': update['current_price'], 'high': update['high_price'], 'low': update['low_price']}
+        for update in updates
+    ])
+    logger.info(f"Stock prices updated for {len(updates)} stocks at {datetime.now()}")
     logger.info("Stock prices updated.")
+    return updates
 
 if __name__ == '__main__':
-    update_stock_prices()
+    from app import create_app
+    with create_app(web=False).app_context():
+        update_stock_prices()
@@ -0,0 +1,17 @@
+from app import create_app
+
+# WSGI entry point (e.g. gunicorn wsgi:app). Web workers only run background
+# jobs when SCHEDULER_ENABLED is set; `python scheduler.py` runs them in a
+# dedicated process instead.
+#
+# Each /stream/prices connection holds its worker for as long as it is open,
+# so with LIVE_PRICES=1 (every dashboard subscribes) sync workers stall after
+# one tab each. Serve it with threads or an async worker instead, e.g.
+#   gunicorn --worker-class gthread --workers 4 --threads 64 wsgi:app
+#   gunicorn --worker-class gevent --workers 4 --worker-connections 1000 wsgi:app
+app = create_app()
+
+if app.config['SCHEDULER_ENABLED']:
+    from jobs import scheduled_jobs
+    from scheduler import start_scheduler
+    start_scheduler(app, scheduled_jobs(app.config))